@@ -0,0 +1,111 @@
+"""Encode/decode cost and stored size of the cache codecs.
+
+`stdlib json` is the previous behaviour, json.dumps stored as a UTF-8 string.
+With REDIS_DSN set, every payload is also written to Redis and the size
+reported by MEMORY USAGE is printed.
+
+Usage:
+    REDIS_DSN=redis://localhost:6379/0 \\
+        python benchmarks/bench_cache_codec.py --rows 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from pathlib import Path
+
+import aioredis
+
+try:
+    from src.pkg import codec, schema
+except ModuleNotFoundError:
+    import sys
+
+    FILE = Path(__file__).resolve()
+    ROOT = FILE.parents[1]  # app folder
+    if str(ROOT) not in sys.path:
+        sys.path.append(str(ROOT))  # add ROOT to PATH
+
+    from src.pkg import codec, schema
+
+
+class StdlibJSON:
+    def encode(self, value):
+        return json.dumps(value).encode()
+
+    def decode(self, payload):
+        return json.loads(payload.decode())
+
+
+def make_payload(rows: int):
+    return [
+        {
+            "id": i,
+            "email": f"user-{i}@example.com",
+            "name": f"User {i}",
+            "created_at": "2024-02-01T12:00:00+00:00",
+            "roles": ["user", "reader"],
+            "score": i * 0.5,
+            "active": i % 3 != 0,
+        }
+        for i in range(rows)
+    ]
+
+
+def per_op_us(func, arg, number: int) -> float:
+    start = time.perf_counter()
+    for _ in range(number):
+        func(arg)
+    return (time.perf_counter() - start) / number * 1e6
+
+
+async def memory_usage(client: aioredis.Redis, payload: bytes) -> int:
+    await client.set("bench:codec", payload)
+    try:
+        return await client.memory_usage("bench:codec")
+    finally:
+        await client.delete("bench:codec")
+
+
+async def main(rows: int, number: int, threshold: int, dsn: str) -> None:
+    value = make_payload(rows)
+    codecs = [("stdlib json", "-", StdlibJSON())]
+    for serializer in schema.CacheSerializer:
+        for compression in schema.CacheCompression:
+            codecs.append(
+                (
+                    serializer.value,
+                    compression.value,
+                    codec.CacheCodec(serializer, compression, threshold),
+                )
+            )
+
+    client = aioredis.from_url(dsn) if dsn else None
+    print(
+        f"{'serializer':<14}{'compression':<13}{'encode us':>11}{'decode us':>11}"
+        f"{'bytes':>9}{'redis bytes':>13}"
+    )
+    for serializer, compression, value_codec in codecs:
+        payload = value_codec.encode(value)
+        assert value_codec.decode(payload) == value
+        encode = per_op_us(value_codec.encode, value, number)
+        decode = per_op_us(value_codec.decode, payload, number)
+        stored = await memory_usage(client, payload) if client else "-"
+        print(
+            f"{serializer:<14}{compression:<13}{encode:>11.1f}{decode:>11.1f}"
+            f"{len(payload):>9}{stored:>13}"
+        )
+
+    if client:
+        await client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cache codec benchmark")
+    parser.add_argument("--rows", type=int, default=200, help="Records per value")
+    parser.add_argument("--number", type=int, default=2000, help="Runs per codec")
+    parser.add_argument("--threshold", type=int, default=1024)
+    parser.add_argument("--dsn", default=os.environ.get("REDIS_DSN"))
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.number, args.threshold, args.dsn))
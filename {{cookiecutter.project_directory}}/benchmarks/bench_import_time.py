@@ -0,0 +1,82 @@
+"""Startup time of the app, with a `python -X importtime` report.
+
+Every run is a fresh interpreter executing `--code`, by default the import of
+the app factory and the construction of the app. The median wall time is
+compared to `--budget-ms`, the script exits with 1 when it is over budget.
+One extra run with `-X importtime` lists the slowest top-level imports.
+The settings are read from the environment, as for the app.
+
+Usage:
+    python benchmarks/bench_import_time.py --budget-ms 1500
+    python benchmarks/bench_import_time.py --code "import src.worker.app"
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]  # app folder
+DEFAULT_CODE = "from src.main import create_app; create_app()"
+# import time: <self us> | <cumulative us> | <two spaces per level><module>
+IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)")
+
+
+def run(code: str, importtime: bool = False) -> subprocess.CompletedProcess:
+    command = [sys.executable]
+    if importtime:
+        command += ["-X", "importtime"]
+    return subprocess.run(
+        [*command, "-c", code],
+        cwd=ROOT,
+        env={**os.environ, "PYTHONPATH": str(ROOT)},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def top_level_imports(stderr: str):
+    imports = []
+    for line in stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match and not match.group(3):
+            imports.append((match.group(4), int(match.group(2)) / 1000))
+    return imports
+
+
+def main(code: str, runs: int, top: int, budget_ms: float) -> int:
+    # Warm the file system cache and the bytecode, then time fresh interpreters
+    run(code)
+    walls = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        run(code)
+        walls.append((time.perf_counter() - start) * 1000)
+    wall = statistics.median(walls)
+
+    imports = top_level_imports(run(code, importtime=True).stderr)
+    total = sum(cumulative for _, cumulative in imports)
+    print(f"code: {code}")
+    print(f"{'module':<48}{'cumulative ms':>14}")
+    for module, cumulative in sorted(imports, key=lambda item: -item[1])[:top]:
+        print(f"{module:<48}{cumulative:>14.1f}")
+    print(f"imports: {total:.1f} ms, wall median of {runs}: {wall:.1f} ms")
+
+    if budget_ms and wall > budget_ms:
+        print(f"Over budget: {wall:.1f} ms > {budget_ms:.1f} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import time benchmark")
+    parser.add_argument("--code", default=DEFAULT_CODE, help="Statement to time")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="Imports listed")
+    parser.add_argument("--budget-ms", type=float, default=0, help="0 disables it")
+    args = parser.parse_args()
+    sys.exit(main(args.code, args.runs, args.top, args.budget_ms))
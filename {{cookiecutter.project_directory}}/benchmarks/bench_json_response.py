@@ -0,0 +1,87 @@
+"""Time to render a 10k-item list of Pydantic models into a JSON response body.
+
+- `jsonable_encoder + JSONResponse` is a route without a response model on
+  FastAPI's default response class.
+- `response_model + ...` is what a route with a response model does: the
+  models are dumped to JSON-compatible dicts, then rendered.
+- `PydanticResponse` is returned by the route and serialized by pydantic-core.
+
+Usage:
+    python benchmarks/bench_json_response.py --items 10000
+"""
+import argparse
+import datetime
+import timeit
+import typing
+from pathlib import Path
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, TypeAdapter
+
+try:
+    from src.pkg import responses
+except ModuleNotFoundError:
+    import sys
+
+    FILE = Path(__file__).resolve()
+    ROOT = FILE.parents[1]  # app folder
+    if str(ROOT) not in sys.path:
+        sys.path.append(str(ROOT))  # add ROOT to PATH
+
+    from src.pkg import responses
+
+
+class Item(BaseModel):
+    id: int
+    name: str
+    email: str
+    price: float
+    active: bool
+    tags: typing.List[str]
+    created_at: datetime.datetime
+
+
+def main(items: int, repeat: int) -> None:
+    now = datetime.datetime.now(datetime.timezone.utc)
+    models = [
+        Item(
+            id=i,
+            name=f"item-{i}",
+            email=f"user-{i}@example.com",
+            price=i * 0.5,
+            active=i % 2 == 0,
+            tags=["a", "b"],
+            created_at=now,
+        )
+        for i in range(items)
+    ]
+    adapter = TypeAdapter(typing.List[Item])
+
+    cases = {
+        "jsonable_encoder + JSONResponse": lambda: JSONResponse(
+            jsonable_encoder(models)
+        ),
+        "response_model + JSONResponse": lambda: JSONResponse(
+            adapter.dump_python(models, mode="json")
+        ),
+        "response_model + ORJSONResponse": lambda: responses.ORJSONResponse(
+            adapter.dump_python(models, mode="json")
+        ),
+        "PydanticResponse": lambda: responses.PydanticResponse(models),
+    }
+
+    baseline = None
+    print(f"{'path':<34}{'ms':>10}{'speedup':>10}")
+    for name, render in cases.items():
+        elapsed = min(timeit.repeat(render, number=1, repeat=repeat)) * 1000
+        baseline = baseline or elapsed
+        print(f"{name:<34}{elapsed:>10.1f}{baseline / elapsed:>9.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="JSON response benchmark")
+    parser.add_argument("--items", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+    main(args.items, args.repeat)
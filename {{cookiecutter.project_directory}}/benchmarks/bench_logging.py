@@ -0,0 +1,142 @@
+"""Cost of log calls for the `LoggerInit` modes.
+
+For every mode, the logger is configured by `LoggerInit` with stdout sent to
+/dev/null and the file in a temporary folder. `--flush-ms` makes every flush
+of stdout sleep, like a slow log collector reading the pipe. Each log call
+runs on the event loop and blocks it for as long as it takes; its duration is
+recorded. `drain ms` is the time `shutdown` then waits for queued records.
+The last rows compare a DEBUG call below the active level with an f-string
+message and with loguru arguments.
+
+Usage:
+    python benchmarks/bench_logging.py --calls 20000
+    python benchmarks/bench_logging.py --calls 2000 --flush-ms 0.5
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from loguru import logger
+
+try:
+    from src.pkg import services
+except ModuleNotFoundError:
+    FILE = Path(__file__).resolve()
+    ROOT = FILE.parents[1]  # app folder
+    if str(ROOT) not in sys.path:
+        sys.path.append(str(ROOT))  # add ROOT to PATH
+
+    from src.pkg import services
+
+MODES = {
+    "text": {},
+    "text enqueue": {"enqueue": True},
+    "json": {"json_format": True},
+    "json enqueue": {"json_format": True, "enqueue": True},
+    "json enqueue 10% INFO": {
+        "json_format": True,
+        "enqueue": True,
+        "sampling": {"INFO": 0.1},
+    },
+}
+PAYLOAD = {f"field_{i}": list(range(10)) for i in range(20)}
+
+
+class SlowStream:
+    def __init__(self, stream, flush_ms: float):
+        self.stream = stream
+        self.flush_ms = flush_ms
+
+    def write(self, message: str) -> None:
+        self.stream.write(message)
+
+    def flush(self) -> None:
+        time.sleep(self.flush_ms / 1000)
+        self.stream.flush()
+
+
+@contextlib.contextmanager
+def configured(log_path: str, flush_ms: float = 0, **options):
+    resource = services.LoggerInit()
+    with open(os.devnull, "w") as devnull:
+        stdout = sys.stdout
+        sys.stdout = SlowStream(devnull, flush_ms) if flush_ms else devnull
+        try:
+            resource.init(
+                app_name="bench",
+                log_path=log_path,
+                show_log_level="INFO",
+                write_log_level="INFO",
+                **options,
+            )
+        finally:
+            sys.stdout = stdout
+        try:
+            yield resource
+        finally:
+            resource.shutdown()
+
+
+async def timed_calls(calls: int, log) -> list:
+    durations = []
+    for i in range(calls):
+        start = time.perf_counter()
+        log(i)
+        durations.append(time.perf_counter() - start)
+        if i % 100 == 0:
+            # Let the loop run, as it would between requests
+            await asyncio.sleep(0)
+    return durations
+
+
+def report(name: str, durations: list, drain: float = 0.0) -> None:
+    durations = sorted(durations)
+    total = sum(durations)
+    p99 = durations[int(len(durations) * 0.99)]
+    print(
+        f"{name:<26}{len(durations) / total:>12,.0f}"
+        f"{statistics.median(durations) * 1e6:>10.1f}{p99 * 1e6:>10.1f}"
+        f"{max(durations) * 1e3:>10.2f}{drain * 1e3:>10.1f}"
+    )
+
+
+async def main(calls: int, flush_ms: float) -> None:
+    print(
+        f"{'mode':<26}{'calls/s':>12}{'p50 us':>10}{'p99 us':>10}"
+        f"{'max ms':>10}{'drain ms':>10}"
+    )
+    with tempfile.TemporaryDirectory() as log_path:
+        for name, options in MODES.items():
+            with configured(log_path, flush_ms, **options) as resource:
+                durations = await timed_calls(
+                    calls,
+                    lambda i: logger.info("request {} done in {} ms", i, 12.5),
+                )
+                start = time.perf_counter()
+                resource.shutdown()
+                drain = time.perf_counter() - start
+            report(name, durations, drain)
+
+        with configured(log_path, flush_ms):
+            report(
+                "debug skipped, f-string",
+                await timed_calls(calls, lambda i: logger.debug(f"payload {PAYLOAD}")),
+            )
+            report(
+                "debug skipped, arguments",
+                await timed_calls(calls, lambda i: logger.debug("payload {}", PAYLOAD)),
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Logging benchmark")
+    parser.add_argument("--calls", type=int, default=20000)
+    parser.add_argument("--flush-ms", type=float, default=0, help="Slow stdout")
+    args = parser.parse_args()
+    asyncio.run(main(args.calls, args.flush_ms))
@@ -0,0 +1,117 @@
+"""p99 latency of `/health` while logins are running.
+
+Compares logins that call bcrypt on the event loop (`verify_password`) with
+logins that offload it to the bounded executor (`verify_password_async`).
+
+Usage:
+    python benchmarks/bench_password_hash.py --logins 20 --workers 2
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from fastapi import FastAPI
+from httpx import AsyncClient
+
+try:
+    from src.pkg import services
+except ModuleNotFoundError:
+    import sys
+
+    FILE = Path(__file__).resolve()
+    ROOT = FILE.parents[1]  # app folder
+    if str(ROOT) not in sys.path:
+        sys.path.append(str(ROOT))  # add ROOT to PATH
+
+    from src.pkg import services
+
+
+PASSWORD = "benchmark-password"
+
+
+def create_app(auth_service: services.BaseAuthService, hashed: str) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/health")
+    async def health_check():
+        return {"detail": "ok"}
+
+    @app.post("/login/blocking")
+    async def login_blocking():
+        return {"ok": auth_service.verify_password(PASSWORD, hashed)}
+
+    @app.post("/login/offloaded")
+    async def login_offloaded():
+        return {"ok": await auth_service.verify_password_async(PASSWORD, hashed)}
+
+    return app
+
+
+async def probe(client: AsyncClient, stop: asyncio.Event, interval: float):
+    # Latency is measured from the time a probe was scheduled, so probes that
+    # could not even be sent while the loop was blocked are still counted.
+    latencies = []
+    scheduled = time.perf_counter()
+    while not stop.is_set():
+        await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+        r = await client.get("/health")
+        r.raise_for_status()
+        latencies.append((time.perf_counter() - scheduled) * 1000)
+        scheduled += interval
+    return latencies
+
+
+async def run(app: FastAPI, login_path: str, logins: int, interval: float):
+    async with AsyncClient(app=app, base_url="http://bench") as client:
+        stop = asyncio.Event()
+        prober = asyncio.create_task(probe(client, stop, interval))
+        start = time.perf_counter()
+        await asyncio.gather(*(client.post(login_path) for _ in range(logins)))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        latencies = await prober
+
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    return {
+        "probes": len(latencies),
+        "p50_ms": statistics.median(latencies),
+        "p99_ms": p99,
+        "max_ms": latencies[-1],
+        "logins_per_sec": logins / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Password hashing benchmark")
+    parser.add_argument("--logins", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--interval-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    hasher = services.PasswordHasher(
+        executor=ThreadPoolExecutor(max_workers=args.workers),
+        max_concurrency=args.workers,
+    )
+    auth_service = services.BaseAuthService(password_hasher=hasher)
+    app = create_app(auth_service, auth_service.get_password_hash(PASSWORD))
+
+    print(
+        f"{'mode':<12}{'probes':>8}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}{'logins/s':>10}"
+    )
+    for mode in ("blocking", "offloaded"):
+        result = asyncio.run(
+            run(app, f"/login/{mode}", args.logins, args.interval_ms / 1000)
+        )
+        print(
+            f"{mode:<12}{result['probes']:>8}{result['p50_ms']:>10.1f}"
+            f"{result['p99_ms']:>10.1f}{result['max_ms']:>10.1f}"
+            f"{result['logins_per_sec']:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -39,7 +39,7 @@ fi
 # If WORKER environment variable is set, run celery command
 if [ "${WORKER}" = "true" ]; then
     echo "Starting celery worker..."
-    exec celery -A src.main.celery worker --loglevel=INFO --concurrency=${WORKER_CONCURRENCY} -E --without-heartbeat --without-mingle --without-gossip -Ofair
+    exec celery -A src.worker.app worker --loglevel=INFO --concurrency=${WORKER_CONCURRENCY} -E --without-heartbeat --without-mingle --without-gossip -Ofair
 fi
 
 # Evaluating passed command:
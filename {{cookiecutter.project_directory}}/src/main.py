@@ -1,11 +1,10 @@
-from fastapi import FastAPI, Request, status
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Request, Response, status
 from contextlib import asynccontextmanager
 from loguru import logger
 
 try:
     from src.config import settings, CeleryConfiguration
-    from src.pkg import middleware
+    from src.pkg import middleware, responses
     from src import __VERSION__
 except ModuleNotFoundError:
     import sys
@@ -18,7 +17,7 @@ except ModuleNotFoundError:
         sys.path.append(str(ROOT))  # add ROOT to PATH
 
     from src.config import settings, CeleryConfiguration  # noqa: F401
-    from src.pkg import middleware
+    from src.pkg import middleware, responses
     from src import __VERSION__
 
 
@@ -35,15 +34,47 @@ def add_routers(app: FastAPI) -> None:
         router.health_router, tags=["Health check"], include_in_schema=True
     )
 
+    # Prometheus metrics
+    if settings.metrics_enabled:
+        app.include_router(
+            router.metrics_router, tags=["Metrics"], include_in_schema=False
+        )
+
 
 # Exceptions
 def add_exceptions(app: FastAPI) -> None:
     import httpx
     from tortoise.exceptions import DoesNotExist, IntegrityError
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.exceptions import RequestValidationError
+    from fastapi.utils import is_body_allowed_for_status_code
+    from starlette.exceptions import HTTPException
+    from src.pkg.repositories import InvalidCursor
+
+    # FastAPI's default handlers, rendered with orjson
+    @app.exception_handler(HTTPException)
+    async def http_exception_handler(request: Request, exc: HTTPException):
+        headers = getattr(exc, "headers", None)
+        if not is_body_allowed_for_status_code(exc.status_code):
+            return Response(status_code=exc.status_code, headers=headers)
+        return responses.ORJSONResponse(
+            status_code=exc.status_code,
+            content={"detail": exc.detail},
+            headers=headers,
+        )
+
+    @app.exception_handler(RequestValidationError)
+    async def validation_exception_handler(
+        request: Request, exc: RequestValidationError
+    ):
+        return responses.ORJSONResponse(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            content={"detail": jsonable_encoder(exc.errors())},
+        )
 
     @app.exception_handler(httpx.HTTPError)
     async def httpx_error_handler(request: Request, exc: httpx.HTTPError):
-        return JSONResponse(
+        return responses.ORJSONResponse(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             content={"detail": "Internal api request error"},
             headers={"X-Error": str(exc)},
@@ -51,18 +82,24 @@ def add_exceptions(app: FastAPI) -> None:
 
     @app.exception_handler(DoesNotExist)
     async def doesnotexist_exception_handler(request: Request, exc: DoesNotExist):
-        return JSONResponse(
+        return responses.ORJSONResponse(
             status_code=status.HTTP_404_NOT_FOUND, content={"detail": str(exc)}
         )
 
     @app.exception_handler(IntegrityError)
     async def integrityerror_exception_handler(request: Request, exc: IntegrityError):
-        return JSONResponse(
+        return responses.ORJSONResponse(
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
             content={"detail": str(exc)},
             headers={"X-Error": "IntegrityError"},
         )
 
+    @app.exception_handler(InvalidCursor)
+    async def invalidcursor_exception_handler(request: Request, exc: InvalidCursor):
+        return responses.ORJSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST, content={"detail": str(exc)}
+        )
+
 
 # Add dependencies injection
 def init_dependencies_inject(app: FastAPI) -> None:
@@ -85,9 +122,14 @@ def init_dependencies_inject(app: FastAPI) -> None:
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    from src.pkg import containers
+
     logger.info("=== Start application ===")
     # Init database and cache
     await app.container.service.init_resources()
+    # Background tasks, the web server only
+    for resource in containers.own_resources(app.container.server):
+        await resource.init()
 
     # Init sentry
     if settings.sentry_dsn:
@@ -102,6 +144,11 @@ async def lifespan(app: FastAPI):
 
     yield
     logger.info("=== Shutdown application ===")
+    for resource in containers.own_resources(app.container.server):
+        await resource.shutdown()
+    # Pipelines still in flight, before the Redis client is closed
+    await app.container.service.cache_service().close()
+    await app.container.service.shutdown_resources()
     await app.container.gateway.shutdown_resources()
 
 
@@ -112,6 +159,7 @@ def create_app(version: str = None) -> FastAPI:
         description=__DESCRIPTION__,
         version=version if version else __VERSION__,
         lifespan=lifespan,
+        default_response_class=responses.ORJSONResponse,
     )
 
     from src.worker import create_celery
@@ -127,8 +175,13 @@ def create_app(version: str = None) -> FastAPI:
     # Add exceptions
     add_exceptions(app)
 
-    # Add middleware
+    # Add middleware, the last one added runs first
+    middleware.add_idempotency_middleware(app)
+    middleware.add_rate_limit_middleware(app)
+    middleware.add_compression_middleware(app)
+    middleware.add_concurrency_limit_middleware(app)
     middleware.add_cors_middleware(app)
+    middleware.add_metrics_middleware(app)
 
     return app
 
@@ -140,7 +193,7 @@ def run_worker():
         [
             "celery",
             "-A",
-            "src.main.celery",
+            "src.worker.app",
             "worker",
             "-c",
             "1",
@@ -160,8 +213,19 @@ def celery_watchgod():
     run_process("./src", run_worker)
 
 
-app = create_app()
-celery = app.celery_app
+def __getattr__(name: str):
+    # `src.main:app` is built on first access, so importing `create_app`
+    # (tests, doc_generator) does not build an app and the worker does not
+    # build one at all
+    if name == "app":
+        app = globals()["app"] = create_app()
+        return app
+    if name == "celery":
+        # Kept for `celery -A src.main.celery`, see `src.worker.app`
+        from src.worker.app import celery
+
+        return celery
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 if __name__ == "__main__":
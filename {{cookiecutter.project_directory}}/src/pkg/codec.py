@@ -0,0 +1,119 @@
+"""Binary encoding of cached values.
+
+A payload is one header byte followed by the serialized value. The header
+records how the body was compressed, so the compression settings can change
+without invalidating the values already stored in Redis.
+"""
+import typing
+import zlib
+
+import orjson
+
+from src.pkg import schema
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+try:
+    import lz4.frame
+except ImportError:  # pragma: no cover
+    lz4 = None
+
+
+_RAW = 0
+_ZLIB = 1
+_LZ4 = 2
+
+
+def _orjson_dumps(value: typing.Any) -> bytes:
+    return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+
+
+def _msgpack_dumps(value: typing.Any) -> bytes:
+    return msgpack.packb(value, use_bin_type=True)
+
+
+def _msgpack_loads(payload: typing.Union[bytes, memoryview]) -> typing.Any:
+    return msgpack.unpackb(payload, raw=False)
+
+
+def _zlib_decompress(payload: typing.Union[bytes, memoryview]) -> bytes:
+    return zlib.decompress(payload)
+
+
+def _lz4_decompress(payload: typing.Union[bytes, memoryview]) -> bytes:
+    if lz4 is None:
+        raise RuntimeError("lz4 is required to decode this cache value")
+    return lz4.frame.decompress(payload)
+
+
+_DECOMPRESSORS = {_ZLIB: _zlib_decompress, _LZ4: _lz4_decompress}
+
+
+class CacheCodec:
+    """Serialize with orjson or msgpack, compress payloads of at least
+    `compress_threshold` bytes with zlib or lz4."""
+
+    __slots__ = (
+        "serializer",
+        "compression",
+        "_dumps",
+        "_loads",
+        "_compress",
+        "_threshold",
+    )
+
+    def __init__(
+        self,
+        serializer: schema.CacheSerializer = schema.CacheSerializer.json,
+        compression: schema.CacheCompression = schema.CacheCompression.none,
+        compress_threshold: int = 1024,
+        compress_level: typing.Optional[int] = None,
+    ):
+        self.serializer = schema.CacheSerializer(serializer)
+        self.compression = schema.CacheCompression(compression)
+        self._threshold = compress_threshold
+
+        if self.serializer == schema.CacheSerializer.msgpack:
+            if msgpack is None:
+                raise RuntimeError("msgpack is not installed")
+            self._dumps, self._loads = _msgpack_dumps, _msgpack_loads
+        else:
+            self._dumps, self._loads = _orjson_dumps, orjson.loads
+
+        self._compress: typing.Optional[typing.Tuple[int, typing.Callable]] = None
+        if self.compression == schema.CacheCompression.zlib:
+            level = -1 if compress_level is None else compress_level
+            self._compress = (_ZLIB, lambda body: zlib.compress(body, level))
+        elif self.compression == schema.CacheCompression.lz4:
+            if lz4 is None:
+                raise RuntimeError("lz4 is not installed")
+            level = 0 if compress_level is None else compress_level
+            self._compress = (
+                _LZ4,
+                lambda body: lz4.frame.compress(body, compression_level=level),
+            )
+
+    def encode(self, value: typing.Any) -> bytes:
+        body = self._dumps(value)
+        if self._compress is not None and len(body) >= self._threshold:
+            header, compress = self._compress
+            compressed = compress(body)
+            # Incompressible values are stored as they are
+            if len(compressed) < len(body):
+                return bytes((header,)) + compressed
+        return bytes((_RAW,)) + body
+
+    def decode(self, payload: bytes) -> typing.Any:
+        if not payload:
+            raise ValueError("Empty cache payload")
+        header, body = payload[0], memoryview(payload)[1:]
+        if header == _RAW:
+            return self._loads(body)
+
+        decompress = _DECOMPRESSORS.get(header)
+        if decompress is None:
+            raise ValueError(f"Unknown cache payload header: {header}")
+        return self._loads(decompress(body))
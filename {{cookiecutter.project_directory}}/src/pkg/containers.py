@@ -1,15 +1,42 @@
+import typing
 from dependency_injector import containers, providers
 
-from src.config import Settings
-from src.pkg import services, db
+from src.config import Settings, get_pg_pool_options
+from src.pkg import services, db, repositories, codec
 
 
 class Gateway(containers.DeclarativeContainer):
     config: Settings = providers.Configuration()
 
-    database_resource = providers.Resource(db.DatabaseResource, dsn=config.pg_dsn)
+    pg_pool_options = providers.Callable(
+        get_pg_pool_options,
+        min_size=config.pg_pool_min_size,
+        max_size=config.pg_pool_max_size,
+        max_inactive_lifetime=config.pg_pool_max_inactive_lifetime,
+        statement_cache_size=config.pg_statement_cache_size,
+        command_timeout=config.pg_command_timeout,
+        statement_timeout_ms=config.pg_statement_timeout_ms,
+        idle_in_transaction_timeout_ms=config.pg_idle_in_transaction_timeout_ms,
+    )
 
-    cache_resource = providers.Resource(db.CacheResource, dsn=config.redis_dsn)
+    database_resource = providers.Resource(
+        db.DatabaseResource,
+        dsn=config.pg_dsn,
+        replica_dsns=config.pg_replica_dsns,
+        pool_options=pg_pool_options,
+        instrument=config.metrics_enabled,
+    )
+
+    cache_resource = providers.Resource(
+        db.CacheResource,
+        dsn=config.redis_dsn,
+        max_connections=config.redis_max_connections,
+        pool_timeout=config.redis_pool_timeout,
+        socket_timeout=config.redis_socket_timeout,
+        socket_connect_timeout=config.redis_socket_connect_timeout,
+        health_check_interval=config.redis_health_check_interval,
+        instrument=config.metrics_enabled,
+    )
 
 
 class Service(containers.DeclarativeContainer):
@@ -22,6 +49,9 @@ class Service(containers.DeclarativeContainer):
         log_path=config.log_path,
         show_log_level=config.show_log_level,
         write_log_level=config.write_log_level,
+        enqueue=config.log_enqueue,
+        json_format=config.log_json,
+        sampling=config.log_sampling,
     )
 
     # Authentication and Authorization
@@ -32,17 +62,78 @@ class Service(containers.DeclarativeContainer):
         expired_time_minute=config.jwt_expire_min,
     )
 
+    password_hash_executor = providers.Resource(
+        services.PasswordHashExecutor,
+        kind=config.password_hash_executor,
+        max_workers=config.password_hash_workers,
+    )
+
+    password_hasher = providers.Singleton(
+        services.PasswordHasher,
+        executor=password_hash_executor,
+        max_concurrency=config.password_hash_max_concurrency,
+    )
+
     auth_service = providers.Singleton(
         services.AuthService,
         jwt_handler=jwt_handler,
         admin_username=config.admin_username,
         admin_password=config.admin_password,
+        token_cache_size=config.jwt_cache_size,
+        token_cache_ttl=config.jwt_cache_ttl_sec,
+        password_hasher=password_hasher,
     )
 
     # Services
     database_service = providers.Singleton(services.DBService)
+    # Request scoped: one registry per request context
+    data_loaders = providers.ContextLocalSingleton(repositories.DataLoaderRegistry)
+    cache_codec = providers.Singleton(
+        codec.CacheCodec,
+        serializer=config.cache_serializer,
+        compression=config.cache_compression,
+        compress_threshold=config.cache_compress_threshold,
+    )
     cache_service = providers.Singleton(
-        services.CacheService, client=gateway.cache_resource
+        services.CacheService,
+        client=gateway.cache_resource,
+        codec=cache_codec,
+        local_cache_size=config.cache_local_size,
+        local_cache_max_bytes=config.cache_local_max_bytes,
+        local_ttl=config.cache_local_ttl_sec,
+        channel=config.cache_invalidation_channel,
+        pipeline_max_batch_size=config.cache_pipeline_max_batch_size,
+    )
+    response_cache = providers.Singleton(
+        services.ResponseCache,
+        client=gateway.cache_resource,
+        prefix=config.response_cache_prefix,
+    )
+    readiness_service = providers.Singleton(
+        services.ReadinessService,
+        checks=providers.Dict(
+            database=database_service.provided.ping,
+            cache=cache_service.provided.ping,
+        ),
+        timeout_ms=config.health_check_timeout_ms,
+        ttl_ms=config.health_ready_cache_ms,
+    )
+
+
+# Background tasks of the web server, initialised in its lifespan only. The
+# Celery worker has no long-lived event loop to run them on.
+class Server(containers.DeclarativeContainer):
+    config: Settings = providers.Configuration()
+    service: Service = providers.DependenciesContainer()
+
+    cache_invalidation_listener = providers.Resource(
+        services.CacheInvalidationListener, cache_service=service.cache_service
+    )
+    loop_monitor = providers.Resource(
+        services.LoopMonitor,
+        interval_ms=config.loop_monitor_interval_ms,
+        threshold_ms=config.loop_block_threshold_ms,
+        enabled=config.loop_monitor_enabled,
     )
 
 
@@ -50,3 +141,18 @@ class Application(containers.DeclarativeContainer):
     config: Settings = providers.Configuration()
     gateway: Gateway = providers.Container(Gateway, config=config)
     service: Service = providers.Container(Service, config=config, gateway=gateway)
+    server: Server = providers.Container(Server, config=config, service=service)
+
+
+def own_resources(container: containers.Container) -> typing.List[providers.Resource]:
+    """Resources of `container` itself, without those of its dependencies.
+
+    `init_resources` also reaches the resources of the containers it depends
+    on, and initialising a running `AsyncResource` again returns its value,
+    which is awaited when that is a task.
+    """
+    return [
+        provider
+        for provider in container.providers.values()
+        if isinstance(provider, providers.Resource)
+    ]
@@ -1,35 +1,101 @@
+import time
 import typing
+import asyncio
 import aioredis
 from loguru import logger
 from tortoise import Tortoise, connections
 from dependency_injector import resources
 from pydantic_core import Url
 
-from src.config import settings, get_tortoise_config
+from src.config import settings, get_tortoise_config, READ_REPLICA_PREFIX
+from src.pkg import metrics, repositories
 
 
 DEFAULT_TORTOISE = get_tortoise_config(str(settings.pg_dsn))
 
 
 class DatabaseResource(resources.AsyncResource):
-    async def init(self, dsn: Url = None):
-        config = get_tortoise_config(dsn) if dsn else DEFAULT_TORTOISE
+    async def init(
+        self,
+        dsn: Url = None,
+        replica_dsns: typing.List[Url] = None,
+        pool_options: typing.Dict = None,
+        instrument: bool = False,
+    ):
+        config = (
+            get_tortoise_config(dsn, replica_dsns, pool_options)
+            if dsn
+            else DEFAULT_TORTOISE
+        )
         await Tortoise.init(config=config)
-        logger.debug("Database initialized")
+        await self.warm_up(list(config["connections"]))
+        if instrument:
+            for name in config["connections"]:
+                metrics.instrument_db_pool(connections.get(name))
+
+        replicas = [
+            name
+            for name in config["connections"]
+            if name.startswith(READ_REPLICA_PREFIX)
+        ]
+        repositories.set_read_replicas(replicas)
+        logger.debug("Database initialized, read replicas: {}", replicas)
+
+    @staticmethod
+    async def warm_up(connection_names: typing.List[str]) -> None:
+        # Pools are created lazily by the first query and open `minsize`
+        # connections up front, do it now instead of in the first requests.
+        await asyncio.gather(
+            *(
+                connections.get(name).execute_query("SELECT 1")
+                for name in connection_names
+            )
+        )
+        logger.debug("Database connection pools warmed up: {}", connection_names)
 
     async def shutdown(self, *args: typing.Any, **kwargs: typing.Any) -> None:
         await connections.close_all()
         logger.debug("Database shutdown")
 
 
+class InstrumentedRedis(aioredis.Redis):
+    """Redis client recording the latency of every command in `metrics`."""
+
+    async def execute_command(self, *args: typing.Any, **options: typing.Any):
+        start = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            name = args[0] if isinstance(args[0], str) else args[0].decode()
+            metrics.REDIS_COMMAND_DURATION.labels(name).observe(
+                time.perf_counter() - start
+            )
+
+
 class CacheResource(resources.Resource):
-    def init(self, dsn: Url) -> aioredis.Redis:
-        redis_client = aioredis.from_url(
-            dsn,
-            encoding="utf-8",
-            decode_responses=True,
-            # health_check_interval=30,
+    def init(
+        self,
+        dsn: Url,
+        max_connections: int = 50,
+        pool_timeout: typing.Optional[float] = 5.0,
+        socket_timeout: typing.Optional[float] = 5.0,
+        socket_connect_timeout: typing.Optional[float] = 5.0,
+        health_check_interval: int = 30,
+        instrument: bool = False,
+    ) -> aioredis.Redis:
+        # Replies are raw bytes, values are decoded by `codec.CacheCodec`.
+        # The blocking pool waits up to `pool_timeout` for a free connection
+        # instead of failing once `max_connections` are in use.
+        pool = aioredis.BlockingConnectionPool.from_url(
+            str(dsn),
+            max_connections=max_connections,
+            timeout=pool_timeout,
+            socket_timeout=socket_timeout,
+            socket_connect_timeout=socket_connect_timeout,
+            health_check_interval=health_check_interval,
         )
+        client_class = InstrumentedRedis if instrument else aioredis.Redis
+        redis_client = client_class(connection_pool=pool)
         logger.debug("Cache initialized")
         return redis_client
 
@@ -1,14 +1,37 @@
-from fastapi import Depends
+import typing
+from fastapi import Depends, HTTPException, status
+from fastapi.security import HTTPBasic, HTTPBasicCredentials
 from dependency_injector.wiring import inject, Provide
 
-from src.pkg import services
+from src.pkg import services, repositories
 from src.pkg.containers import Application
 
 
 class CommonQueryParams:
-    def __init__(self, skip: int = 0, limit: int = 100):
+    def __init__(
+        self, skip: int = 0, limit: int = 100, cursor: typing.Optional[str] = None
+    ):
         self.skip = skip
         self.limit = limit
+        # Opaque keyset cursor, see `CRUDBase.filter_keyset`
+        self.cursor = cursor
+
+
+# Async, a hashed admin password is verified on the password hasher
+@inject
+async def depend_admin(
+    credentials: HTTPBasicCredentials = Depends(HTTPBasic()),
+    auth_service: services.AuthService = Depends(
+        Provide[Application.service.auth_service]
+    ),
+) -> str:
+    if not await auth_service.authenticate_admin_async(credentials):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect username or password",
+            headers={"WWW-Authenticate": "Basic"},
+        )
+    return credentials.username
 
 
 @inject
@@ -27,3 +50,32 @@ def depend_cache_service(
     ),
 ) -> services.CacheService:
     return cache_service
+
+
+@inject
+def depend_response_cache(
+    response_cache: services.ResponseCache = Depends(
+        Provide[Application.service.response_cache]
+    ),
+) -> services.ResponseCache:
+    return response_cache
+
+
+@inject
+def depend_readiness_service(
+    readiness_service: services.ReadinessService = Depends(
+        Provide[Application.service.readiness_service]
+    ),
+) -> services.ReadinessService:
+    return readiness_service
+
+
+# Async on purpose: sync dependencies run in a threadpool copy of the request
+# context, so the registry would not be shared with the rest of the request.
+@inject
+async def depend_data_loaders(
+    data_loaders: repositories.DataLoaderRegistry = Depends(
+        Provide[Application.service.data_loaders]
+    ),
+) -> repositories.DataLoaderRegistry:
+    return data_loaders
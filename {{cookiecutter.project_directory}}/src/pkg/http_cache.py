@@ -0,0 +1,218 @@
+import typing
+import asyncio
+import hashlib
+import inspect
+import functools
+from fastapi import Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.routing import serialize_response
+
+from src.pkg import services
+
+_REQUEST_PARAM = "_response_cache_request"
+
+
+def make_etag(body: bytes) -> str:
+    # Strong validator, it changes with every byte of the body
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    # If-None-Match uses the weak comparison, W/ prefixes are ignored
+    if if_none_match.strip() == "*":
+        return True
+    return any(
+        candidate.strip().removeprefix("W/") == etag
+        for candidate in if_none_match.split(",")
+    )
+
+
+def cache_response(
+    ttl: int = 60,
+    tags: typing.Iterable[str] = (),
+    vary_headers: typing.Iterable[str] = (),
+    vary_user: bool = False,
+    public: bool = False,
+):
+    """Cache the serialized response of a GET route in Redis.
+
+    The key is built from the path, the query string, the `vary_headers` and,
+    with `vary_user`, the subject and scopes of the bearer JWT. Requests with
+    an Authorization or X-API-Key header are not cached otherwise, unless the
+    route is `public`, i.e. its response does not depend on the caller.
+    Responses carry a strong ETag and a matching If-None-Match gets a 304.
+    Route dependencies still run on hits, only the handler and the
+    serialization are skipped. Headers set on an injected `Response` are
+    cached with the body, responses setting a cookie are never cached.
+    `tags` are formatted with the path params, e.g. "item:{item_id}", and
+    purged with `ResponseCache.invalidate_tags`.
+    """
+    tags = tuple(tags)
+    vary_headers = tuple(header.lower() for header in vary_headers)
+
+    def decorator(func: typing.Callable) -> typing.Callable:
+        signature = inspect.signature(func)
+        request_param = inspect.Parameter(
+            _REQUEST_PARAM, inspect.Parameter.KEYWORD_ONLY, annotation=Request
+        )
+
+        @functools.wraps(func)
+        async def wrapper(*args: typing.Any, **kwargs: typing.Any) -> typing.Any:
+            request: Request = kwargs.pop(_REQUEST_PARAM)
+            call = functools.partial(_call, func, *args, **kwargs)
+            if request.method != "GET":
+                return await call()
+
+            key = _build_key(request, vary_headers, vary_user, public)
+            if key is None:
+                return await call()
+            # The `Response` FastAPI injects, if the handler asks for one
+            sub_response = next(
+                (value for value in kwargs.values() if isinstance(value, Response)),
+                None,
+            )
+
+            cache: services.ResponseCache = (
+                request.app.container.service.response_cache()
+            )
+            headers = {"Vary": "Authorization"} if vary_user else {}
+            if_none_match = request.headers.get("if-none-match")
+            if if_none_match:
+                etag = await cache.get_etag(key)
+                if etag is not None and etag_matches(if_none_match, etag):
+                    return _not_modified(etag, headers)
+
+            entry = await cache.get(key)
+            if entry is not None:
+                response = Response(
+                    entry["body"],
+                    media_type=entry["media_type"],
+                    headers={**headers, "ETag": entry["etag"], "X-Cache": "HIT"},
+                )
+                for name, value in entry["headers"]:
+                    response.headers.append(name, value)
+                return response
+
+            response = await _render(request, await call())
+            # FastAPI only merges the injected response into rendered values
+            extra_headers = _merge_sub_response(response, sub_response)
+            # Streaming and file responses have no body to store
+            if (
+                response.status_code != status.HTTP_200_OK
+                or not hasattr(response, "body")
+                or any(name == "set-cookie" for name, _ in extra_headers)
+            ):
+                return response
+
+            etag = make_etag(response.body)
+            await cache.set(
+                key,
+                response.body,
+                etag,
+                response.media_type or "application/octet-stream",
+                ttl,
+                [tag.format(**request.path_params) for tag in tags],
+                extra_headers,
+            )
+            if if_none_match and etag_matches(if_none_match, etag):
+                return _not_modified(etag, headers)
+            response.headers.update({**headers, "ETag": etag, "X-Cache": "MISS"})
+            return response
+
+        setattr(
+            wrapper,
+            "__signature__",
+            signature.replace(
+                parameters=[*signature.parameters.values(), request_param]
+            ),
+        )
+        return wrapper
+
+    return decorator
+
+
+async def _call(func: typing.Callable, *args: typing.Any, **kwargs: typing.Any):
+    if asyncio.iscoroutinefunction(func):
+        return await func(*args, **kwargs)
+    return await run_in_threadpool(func, *args, **kwargs)
+
+
+def _build_key(
+    request: Request,
+    vary_headers: typing.Tuple[str, ...],
+    vary_user: bool,
+    public: bool,
+) -> typing.Optional[str]:
+    # None when the response must not be cached
+    user = None
+    authorization = request.headers.get("authorization", "")
+    authenticated = bool(authorization or request.headers.get("x-api-key"))
+    if vary_user:
+        scheme, _, token = authorization.partition(" ")
+        if token and scheme.lower() == "bearer":
+            auth_service: services.AuthService = (
+                request.app.container.service.auth_service()
+            )
+            verified = auth_service.get_jwt_user(token)
+            if verified is None:
+                # Invalid token, leave the response to the handler
+                return None
+            user = [verified[0].id, sorted(verified[1])]
+        elif authenticated:
+            # Credentials the key cannot tell apart
+            return None
+    elif authenticated and not public:
+        return None
+
+    cache: services.ResponseCache = request.app.container.service.response_cache()
+    return cache.make_key(
+        request.url.path,
+        sorted(request.query_params.multi_items()),
+        [request.headers.get(header) for header in vary_headers],
+        user,
+    )
+
+
+def _merge_sub_response(
+    response: Response, sub_response: typing.Optional[Response]
+) -> typing.List[typing.Tuple[str, str]]:
+    if sub_response is None:
+        return []
+    if sub_response.status_code is not None:
+        response.status_code = sub_response.status_code
+    headers = [
+        (name.decode("latin-1"), value.decode("latin-1"))
+        for name, value in sub_response.headers.raw
+    ]
+    for name, value in headers:
+        response.headers.append(name, value)
+    return headers
+
+
+async def _render(request: Request, content: typing.Any) -> Response:
+    if isinstance(content, Response):
+        return content
+
+    # Same serialization FastAPI applies to the return value of the route
+    route = request.scope["route"]
+    value = await serialize_response(
+        field=route.secure_cloned_response_field,
+        response_content=content,
+        include=route.response_model_include,
+        exclude=route.response_model_exclude,
+        by_alias=route.response_model_by_alias,
+        exclude_unset=route.response_model_exclude_unset,
+        exclude_defaults=route.response_model_exclude_defaults,
+        exclude_none=route.response_model_exclude_none,
+    )
+    response_class = route.response_class
+    if isinstance(response_class, DefaultPlaceholder):
+        response_class = response_class.value
+    return response_class(value, status_code=route.status_code or status.HTTP_200_OK)
+
+
+def _not_modified(etag: str, headers: typing.Dict[str, str]) -> Response:
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED, headers={**headers, "ETag": etag}
+    )
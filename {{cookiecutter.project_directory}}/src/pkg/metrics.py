@@ -0,0 +1,377 @@
+"""Prometheus metrics rendered in the text exposition format.
+
+Metrics are plain Python numbers updated from the event loop thread, there is
+no locking. Histograms allocate one counter per bucket up front and find the
+bucket with a bisect. Values are per process: with several workers, every
+worker exposes its own.
+"""
+import time
+import typing
+import bisect
+import asyncio
+from loguru import logger
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.075,
+    0.1,
+    0.25,
+    0.5,
+    0.75,
+    1.0,
+    2.5,
+    5.0,
+    7.5,
+    10.0,
+)
+# Redis commands and pool waits are usually well under a millisecond
+FAST_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+)
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: typing.Sequence[str], values: typing.Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: typing.Dict[str, "Metric"] = {}
+
+    def register(self, metric: "Metric") -> None:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        lines: typing.List[str] = []
+        for metric in self._metrics.values():
+            metric.render(lines)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class Metric:
+    type = ""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: typing.Sequence[str] = (),
+        registry: typing.Optional[Registry] = REGISTRY,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: typing.Dict[typing.Tuple[str, ...], typing.Any] = {}
+        if registry is not None:
+            registry.register(self)
+
+    def labels(self, *values: str):
+        # Children are created once per label set, later calls are a dict lookup
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError()
+
+    def render(self, lines: typing.List[str]) -> None:
+        lines.append(f"# HELP {self.name} {self.documentation}")
+        lines.append(f"# TYPE {self.name} {self.type}")
+        for values, child in self._children.items():
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}{labels} {_format_value(child.value)}")
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: typing.Tuple[float, ...]):
+        self.bounds = bounds
+        # One slot per bucket plus the +Inf one
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: typing.Sequence[str] = (),
+        buckets: typing.Sequence[float] = DEFAULT_BUCKETS,
+        registry: typing.Optional[Registry] = REGISTRY,
+    ):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self) -> _HistogramValue:
+        return _HistogramValue(self.buckets)
+
+    def render(self, lines: typing.List[str]) -> None:
+        lines.append(f"# HELP {self.name} {self.documentation}")
+        lines.append(f"# TYPE {self.name} {self.type}")
+        names = (*self.labelnames, "le")
+        for values, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), child.counts):
+                cumulative += count
+                labels = _format_labels(names, (*values, _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+
+
+# HTTP, updated by `middleware.MetricsMiddleware`
+HTTP_REQUESTS = Counter(
+    "http_requests_total",
+    "HTTP requests by route template and status code.",
+    ("method", "route", "status"),
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template.",
+    ("method", "route"),
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "HTTP requests being served by route template.",
+    ("method", "route"),
+)
+
+# Database pools, the gauges are read at scrape time
+DB_POOL_SIZE = Gauge(
+    "db_pool_connections", "Open connections in the pool.", ("connection",)
+)
+DB_POOL_IN_USE = Gauge(
+    "db_pool_connections_in_use", "Connections checked out.", ("connection",)
+)
+DB_POOL_MAX = Gauge(
+    "db_pool_connections_max", "Maximum size of the pool.", ("connection",)
+)
+DB_POOL_ACQUIRE = Histogram(
+    "db_pool_acquire_seconds",
+    "Time spent waiting for a pool connection.",
+    ("connection",),
+    buckets=FAST_BUCKETS,
+)
+
+# Redis, updated by `db.InstrumentedRedis` and `services.RedisBatcher`
+REDIS_COMMAND_DURATION = Histogram(
+    "redis_command_duration_seconds",
+    "Redis command latency, including the wait for a pool connection.",
+    ("command",),
+    buckets=FAST_BUCKETS,
+)
+
+# Password hashing, updated by `services.PasswordHasher`
+PASSWORD_HASH_WAITING = Gauge(
+    "password_hash_waiting", "Hash calls waiting for a free executor slot."
+)
+PASSWORD_HASH_RUNNING = Gauge(
+    "password_hash_running", "Hash calls running on the executor."
+)
+PASSWORD_HASH_COMPLETED = Counter(
+    "password_hash_completed_total", "Hash calls done, failed ones included."
+)
+
+# Event loop, updated by `services.LoopMonitor`
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds",
+    "How late the loop monitor wakes up after its sleep.",
+    buckets=FAST_BUCKETS,
+)
+EVENT_LOOP_BLOCKED = Counter(
+    "event_loop_blocked_total",
+    "Event loop stalls longer than the threshold, their stack is logged.",
+)
+
+# Load shedding, updated by `middleware.ConcurrencyLimitMiddleware`
+CONCURRENCY_LIMIT = Gauge(
+    "http_concurrency_limit", "Adaptive limit of requests served at once."
+)
+CONCURRENCY_REJECTED = Counter(
+    "http_concurrency_rejected_total", "Requests shed with 503 over the limit."
+)
+
+# Celery, read from the broker at scrape time
+CELERY_QUEUE_LENGTH = Gauge(
+    "celery_queue_length", "Messages waiting in the broker queue.", ("queue",)
+)
+
+
+class _TimedAcquire:
+    """Time `Pool.acquire`, awaited or used with `async with`."""
+
+    __slots__ = ("_context", "_histogram")
+
+    def __init__(self, context: typing.Any, histogram: _HistogramValue):
+        self._context = context
+        self._histogram = histogram
+
+    def __await__(self):
+        return self._timed(self._context).__await__()
+
+    async def __aenter__(self):
+        return await self._timed(self._context.__aenter__())
+
+    async def __aexit__(self, *args: typing.Any):
+        return await self._context.__aexit__(*args)
+
+    async def _timed(self, acquire: typing.Awaitable):
+        start = time.perf_counter()
+        try:
+            return await acquire
+        finally:
+            self._histogram.observe(time.perf_counter() - start)
+
+
+class TimedPool:
+    """Proxy of an asyncpg pool recording the wait of every `acquire`.
+
+    asyncpg pools use `__slots__`, so the Tortoise client gets the proxy in
+    place of its pool instead of patching the pool itself.
+    """
+
+    def __init__(self, pool: typing.Any, name: str):
+        self.pool = pool
+        self._histogram = DB_POOL_ACQUIRE.labels(name)
+
+    def acquire(self, *, timeout: typing.Optional[float] = None) -> _TimedAcquire:
+        return _TimedAcquire(self.pool.acquire(timeout=timeout), self._histogram)
+
+    def __getattr__(self, name: str) -> typing.Any:
+        return getattr(self.pool, name)
+
+
+def instrument_db_pool(client: typing.Any) -> None:
+    pool = getattr(client, "_pool", None)
+    if pool is not None and not isinstance(pool, TimedPool):
+        client._pool = TimedPool(pool, client.connection_name)
+
+
+def collect_db_pools() -> None:
+    from tortoise import connections
+
+    for client in connections.all():
+        pool = getattr(client, "_pool", None)
+        if pool is None:
+            continue
+        if isinstance(pool, TimedPool):
+            pool = pool.pool
+        size = pool.get_size()
+        DB_POOL_SIZE.labels(client.connection_name).set(size)
+        DB_POOL_IN_USE.labels(client.connection_name).set(size - pool.get_idle_size())
+        DB_POOL_MAX.labels(client.connection_name).set(pool.get_max_size())
+
+
+def _celery_queue_lengths(
+    celery_app: typing.Any, queues: typing.Iterable[str]
+) -> typing.Dict[str, int]:
+    lengths = {}
+    with celery_app.connection_for_read() as connection:
+        connection.ensure_connection(max_retries=1)
+        for queue in queues:
+            # A passive declare only reads the queue; a missing queue is empty.
+            # One channel per queue, AMQP closes the channel on a missing queue.
+            try:
+                with connection.channel() as channel:
+                    lengths[queue] = channel.queue_declare(
+                        queue=queue, passive=True
+                    ).message_count
+            except connection.channel_errors:
+                lengths[queue] = 0
+    return lengths
+
+
+async def collect_celery_queues(
+    celery_app: typing.Any, queues: typing.Iterable[str], timeout: float = 2.0
+) -> None:
+    from fastapi.concurrency import run_in_threadpool
+
+    try:
+        lengths = await asyncio.wait_for(
+            run_in_threadpool(_celery_queue_lengths, celery_app, list(queues)),
+            timeout,
+        )
+    except Exception as exc:
+        logger.warning("Celery queue lengths are unavailable: {!r}", exc)
+        return
+    for queue, length in lengths.items():
+        CELERY_QUEUE_LENGTH.labels(queue).set(length)
@@ -1,10 +1,35 @@
-import sentry_sdk
-from fastapi import FastAPI
+import json
+import math
+import time
+import zlib
+import typing
+import asyncio
+import hashlib
+import ipaddress
+import secrets
+import aioredis
+from aioredis.client import Script
+from fastapi import FastAPI, status
 from fastapi.middleware.cors import CORSMiddleware
-from sentry_sdk.integrations.fastapi import FastApiIntegration
-from sentry_sdk.integrations.celery import CeleryIntegration
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.routing import Match, Route
+from starlette.types import ASGIApp, Receive, Scope, Send
 from loguru import logger
 
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+from src.config import settings
+from src.pkg import metrics, responses, schema, services, utils
+
 
 # Initialize sentry
 def init_sentry(
@@ -17,12 +42,19 @@ def init_sentry(
     celery_integration: bool = False,
     enable_tracing: bool = True,
 ) -> None:
+    # Imported here, sentry_sdk is slow to import and most runs have no DSN
+    import sentry_sdk
+
     logger.info("Initialize sentry")
     integrations = []
     if fastapi_integration:
+        from sentry_sdk.integrations.fastapi import FastApiIntegration
+
         integrations.append(FastApiIntegration(transaction_style="endpoint"))
 
     if celery_integration:
+        from sentry_sdk.integrations.celery import CeleryIntegration
+
         integrations.append(CeleryIntegration())
 
     sentry_sdk.init(
@@ -50,3 +82,881 @@ def add_cors_middleware(app: FastAPI) -> None:
         allow_methods=["*"],
         allow_headers=["*"],
     )
+
+
+# Token bucket. KEYS: bucket. ARGV: rate per second, burst, tokens wanted.
+# Grants up to the wanted tokens, returns {granted, retry after ms}.
+_TOKEN_BUCKET = """
+redis.replicate_commands()
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local wanted = tonumber(ARGV[3])
+local time = redis.call("TIME")
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+
+local bucket = redis.call("HMGET", KEYS[1], "tokens", "ts")
+local tokens = tonumber(bucket[1]) or burst
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate / 1000)
+
+local granted = math.min(wanted, math.floor(tokens))
+tokens = tokens - granted
+redis.call("HSET", KEYS[1], "tokens", tostring(tokens), "ts", now)
+redis.call("PEXPIRE", KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+
+local retry_after = 0
+if granted == 0 then
+    retry_after = math.ceil((1 - tokens) / rate * 1000)
+end
+return {granted, retry_after}
+"""
+
+
+class RateLimit(typing.NamedTuple):
+    rate: float
+    burst: int
+
+
+class RateLimitMiddleware:
+    """Token bucket rate limiting per route and principal, shared through Redis.
+
+    The longest matching prefix of `routes` picks the limit, other paths use
+    `default`. Up to `local_batch` tokens are taken from Redis at once and
+    spent by this worker within `local_window` seconds, so a worker may
+    admit slightly less than the limit but rarely calls Redis per request.
+    Requests are let through when Redis is unavailable. Clients of
+    `trusted_proxies` are keyed on their X-Forwarded-For address.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        redis: typing.Callable[[], aioredis.Redis],
+        auth_service: typing.Callable[[], services.AuthService],
+        default: RateLimit,
+        routes: typing.Optional[typing.Dict[str, RateLimit]] = None,
+        exempt_paths: typing.Iterable[str] = (),
+        principal: schema.RateLimitPrincipal = schema.RateLimitPrincipal.ip,
+        trusted_proxies: typing.Iterable[str] = (),
+        local_batch: int = 5,
+        local_window: float = 1.0,
+        prefix: str = "ratelimit",
+    ):
+        self.app = app
+        self._redis = redis
+        self._auth_service = auth_service
+        self._script: typing.Optional[Script] = None
+        # Longest prefix first
+        self.routes = sorted(
+            (routes or {}).items(), key=lambda item: len(item[0]), reverse=True
+        )
+        self.default = default
+        self.exempt_paths = frozenset(exempt_paths)
+        self.principal = schema.RateLimitPrincipal(principal)
+        self.trusted_proxies = [
+            ipaddress.ip_network(proxy, strict=False) for proxy in trusted_proxies
+        ]
+        self.local_batch = max(1, local_batch)
+        self.prefix = prefix
+        self._allowance: utils.LRUCache[str, typing.List[int]] = utils.LRUCache(
+            maxsize=10000, ttl=local_window
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in self.exempt_paths:
+            return await self.app(scope, receive, send)
+
+        name, limit = self._match(scope["path"])
+        if limit.rate <= 0:
+            return await self.app(scope, receive, send)
+
+        key = f"{self.prefix}:{name}:{self._get_principal(scope)}"
+        retry_after = await self._acquire(key, limit)
+        if retry_after:
+            response = responses.ORJSONResponse(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                content={"detail": "Too many requests"},
+                headers={"Retry-After": str(retry_after)},
+            )
+            return await response(scope, receive, send)
+
+        await self.app(scope, receive, send)
+
+    def _match(self, path: str) -> typing.Tuple[str, RateLimit]:
+        for prefix, limit in self.routes:
+            if path.startswith(prefix):
+                return prefix, limit
+        return "default", self.default
+
+    def _get_principal(self, scope: Scope) -> str:
+        headers = Headers(scope=scope)
+        if self.principal == schema.RateLimitPrincipal.api_key:
+            api_key = headers.get("x-api-key")
+            if api_key:
+                # Never keep the key itself in Redis
+                return "key:" + hashlib.sha256(api_key.encode()).hexdigest()[:32]
+        elif self.principal == schema.RateLimitPrincipal.jwt_sub:
+            scheme, _, token = headers.get("authorization", "").partition(" ")
+            if token and scheme.lower() == "bearer":
+                verified = self._auth_service().get_jwt_user(token)
+                if verified is not None:
+                    return f"sub:{verified[0].id}"
+
+        # Fall back to the client address
+        client = scope.get("client")
+        host = client[0] if client else "unknown"
+        if self._is_trusted(host):
+            # The last address not appended by one of our proxies
+            for address in reversed(headers.get("x-forwarded-for", "").split(",")):
+                address = address.strip()
+                if address and not self._is_trusted(address):
+                    host = address
+                    break
+        return f"ip:{host}"
+
+    def _is_trusted(self, host: str) -> bool:
+        if not self.trusted_proxies:
+            return False
+        try:
+            address = ipaddress.ip_address(host)
+        except ValueError:
+            return False
+        return any(address in network for network in self.trusted_proxies)
+
+    async def _acquire(self, key: str, limit: RateLimit) -> int:
+        """Take one token, return 0 or the seconds to wait before retrying."""
+        allowance = self._allowance.get(key)
+        if allowance is not None:
+            allowance[0] -= 1
+            if allowance[0] <= 0:
+                self._allowance.delete(key)
+            return 0
+
+        try:
+            if self._script is None:
+                self._script = self._redis().register_script(_TOKEN_BUCKET)
+            granted, retry_after_ms = await self._script(
+                keys=[key],
+                args=[limit.rate, limit.burst, min(self.local_batch, limit.burst)],
+            )
+        except (aioredis.RedisError, OSError) as exc:
+            logger.warning("[RateLimit]::Redis unavailable, request allowed: {}", exc)
+            return 0
+
+        if granted == 0:
+            return max(1, math.ceil(retry_after_ms / 1000))
+        if granted > 1:
+            self._allowance.set(key, [granted - 1])
+        return 0
+
+
+def add_rate_limit_middleware(app: FastAPI) -> None:
+    routes = {
+        prefix: RateLimit(*limit)
+        for prefix, limit in settings.rate_limit_routes.items()
+    }
+    if settings.rate_limit_per_second <= 0 and not any(
+        limit.rate > 0 for limit in routes.values()
+    ):
+        return
+
+    app.add_middleware(
+        RateLimitMiddleware,
+        redis=app.container.gateway.cache_resource,
+        auth_service=app.container.service.auth_service,
+        default=RateLimit(settings.rate_limit_per_second, settings.rate_limit_burst),
+        routes=routes,
+        exempt_paths=settings.rate_limit_exempt_paths,
+        principal=settings.rate_limit_principal,
+        trusted_proxies=settings.rate_limit_trusted_proxies,
+        local_batch=settings.rate_limit_local_batch,
+        local_window=settings.rate_limit_local_window,
+    )
+
+
+# Stored response or lock, at once so a response stored in between is not
+# missed. KEYS: response, lock. ARGV: lock token, lock ttl ms. Returns the
+# stored hash, 1 when locked, 0 when another request holds the lock.
+_GET_OR_LOCK = """
+local stored = redis.call("HGETALL", KEYS[1])
+if #stored > 0 then
+    return stored
+end
+if redis.call("SET", KEYS[2], ARGV[1], "NX", "PX", ARGV[2]) then
+    return 1
+end
+return 0
+"""
+
+
+class IdempotencyMiddleware:
+    """Replay the stored response of requests repeated with an Idempotency-Key.
+
+    Keys are scoped to the Authorization or X-API-Key header of the caller.
+    The first request takes a short lock and runs, its response is kept for
+    `ttl` seconds unless it is a 5xx or larger than `max_body_size`. Duplicates
+    arriving meanwhile wait up to `lock_ttl` seconds for that response, then
+    get a 409. Reusing a key with a different request gets a 422. Request
+    bodies are buffered to fingerprint them, above `max_body_size` the
+    request gets a 413.
+    """
+
+    methods = frozenset({"POST", "PUT", "PATCH", "DELETE"})
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        redis: typing.Callable[[], aioredis.Redis],
+        ttl: int = 86400,
+        lock_ttl: float = 30.0,
+        max_body_size: int = 1024 * 1024,
+        poll_interval: float = 0.05,
+        prefix: str = "idempotency",
+    ):
+        self.app = app
+        self._redis = redis
+        self._get_or_lock_script: typing.Optional[Script] = None
+        self._release_lock: typing.Optional[Script] = None
+        self.ttl = ttl
+        self.lock_ttl = lock_ttl
+        self.max_body_size = max_body_size
+        self.poll_interval = poll_interval
+        self.prefix = prefix
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] not in self.methods:
+            return await self.app(scope, receive, send)
+
+        headers = Headers(scope=scope)
+        idempotency_key = headers.get("idempotency-key")
+        if not idempotency_key:
+            return await self.app(scope, receive, send)
+        if len(idempotency_key) > 255:
+            response = responses.ORJSONResponse(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                content={"detail": "Idempotency-Key is longer than 255 characters"},
+            )
+            return await response(scope, receive, send)
+
+        body = await _read_body(receive, self.max_body_size)
+        if body is None:
+            response = responses.ORJSONResponse(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                content={"detail": "Request body is too large for an Idempotency-Key"},
+            )
+            return await response(scope, receive, send)
+        receive = _replay_body(body, receive)
+        fingerprint = hashlib.sha256(
+            b"\0".join(
+                (
+                    scope["method"].encode(),
+                    scope["path"].encode(),
+                    scope["query_string"],
+                    body,
+                )
+            )
+        ).hexdigest()
+        owner = headers.get("authorization") or headers.get("x-api-key") or ""
+        key = f"{self.prefix}:{hashlib.sha256(owner.encode()).hexdigest()[:32]}:{idempotency_key}"
+
+        client = self._redis()
+        try:
+            stored, token = await self._get_or_lock(client, key)
+        except (aioredis.RedisError, OSError) as exc:
+            logger.warning(
+                "[Idempotency]::Redis unavailable, request not deduplicated: {}", exc
+            )
+            return await self.app(scope, receive, send)
+
+        if stored is not None:
+            return await self._replay(stored, fingerprint, scope, receive, send)
+        if token is None:
+            response = responses.ORJSONResponse(
+                status_code=status.HTTP_409_CONFLICT,
+                content={
+                    "detail": "A request with this Idempotency-Key is in progress"
+                },
+                headers={"Retry-After": str(math.ceil(self.lock_ttl))},
+            )
+            return await response(scope, receive, send)
+
+        try:
+            await self._run_and_store(client, key, fingerprint, scope, receive, send)
+        finally:
+            try:
+                if self._release_lock is None:
+                    self._release_lock = client.register_script(
+                        services.RELEASE_LOCK_SCRIPT
+                    )
+                await self._release_lock(keys=[f"{key}:lock"], args=[token])
+            except (aioredis.RedisError, OSError) as exc:
+                logger.warning("[Idempotency]::Could not release lock: {}", exc)
+
+    async def _get_or_lock(
+        self, client: aioredis.Redis, key: str
+    ) -> typing.Tuple[typing.Optional[typing.Dict], typing.Optional[str]]:
+        # Returns the stored response, or the lock token if this request runs
+        if self._get_or_lock_script is None:
+            self._get_or_lock_script = client.register_script(_GET_OR_LOCK)
+        deadline = time.monotonic() + self.lock_ttl
+        while True:
+            token = secrets.token_hex(8)
+            result = await self._get_or_lock_script(
+                keys=[key, f"{key}:lock"], args=[token, int(self.lock_ttl * 1000)]
+            )
+            if isinstance(result, list):
+                return dict(zip(result[::2], result[1::2])), None
+            if result:
+                return None, token
+            if time.monotonic() >= deadline:
+                return None, None
+            await asyncio.sleep(self.poll_interval)
+
+    async def _run_and_store(
+        self,
+        client: aioredis.Redis,
+        key: str,
+        fingerprint: str,
+        scope: Scope,
+        receive: Receive,
+        send: Send,
+    ) -> None:
+        start: typing.Dict = {}
+        chunks: typing.List[bytes] = []
+        size = 0
+
+        async def send_and_record(message: typing.Dict) -> None:
+            nonlocal size
+            if message["type"] == "http.response.start":
+                start.update(message)
+            elif message["type"] == "http.response.body" and (
+                size <= self.max_body_size
+            ):
+                # Stop recording once the body is too large to be stored
+                chunk = message.get("body", b"")
+                size += len(chunk)
+                chunks.append(chunk)
+            await send(message)
+
+        await self.app(scope, receive, send_and_record)
+
+        if not start or start["status"] >= 500 or size > self.max_body_size:
+            return
+        headers = [
+            [name.decode("latin-1"), value.decode("latin-1")]
+            for name, value in start.get("headers", [])
+        ]
+        try:
+            await (
+                client.pipeline(transaction=True)
+                .hset(
+                    key,
+                    mapping={
+                        "fingerprint": fingerprint,
+                        "status": start["status"],
+                        "headers": json.dumps(headers),
+                        "body": b"".join(chunks),
+                    },
+                )
+                .expire(key, self.ttl)
+                .execute()
+            )
+        except (aioredis.RedisError, OSError) as exc:
+            logger.warning("[Idempotency]::Could not store response: {}", exc)
+
+    async def _replay(
+        self,
+        stored: typing.Dict[bytes, bytes],
+        fingerprint: str,
+        scope: Scope,
+        receive: Receive,
+        send: Send,
+    ) -> None:
+        if stored[b"fingerprint"].decode() != fingerprint:
+            response = responses.ORJSONResponse(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                content={"detail": "Idempotency-Key was used with a different request"},
+            )
+            return await response(scope, receive, send)
+
+        headers = [
+            (name.encode("latin-1"), value.encode("latin-1"))
+            for name, value in json.loads(stored[b"headers"])
+        ]
+        headers.append((b"idempotent-replayed", b"true"))
+        await send(
+            {
+                "type": "http.response.start",
+                "status": int(stored[b"status"]),
+                "headers": headers,
+            }
+        )
+        await send({"type": "http.response.body", "body": stored[b"body"]})
+
+
+async def _read_body(receive: Receive, max_size: int) -> typing.Optional[bytes]:
+    # None once the body is larger than `max_size`
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > max_size:
+            return None
+        chunks.append(chunk)
+        if not message.get("more_body", False):
+            return b"".join(chunks)
+
+
+def _replay_body(body: bytes, receive: Receive) -> Receive:
+    sent = False
+
+    async def replay() -> typing.Dict:
+        nonlocal sent
+        if sent:
+            return await receive()
+        sent = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    return replay
+
+
+def add_idempotency_middleware(app: FastAPI) -> None:
+    app.add_middleware(
+        IdempotencyMiddleware,
+        redis=app.container.gateway.cache_resource,
+        ttl=settings.idempotency_ttl_sec,
+        lock_ttl=settings.idempotency_lock_ttl_sec,
+        max_body_size=settings.idempotency_max_body_bytes,
+    )
+
+
+DEFAULT_COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+    "text/",
+)
+
+
+class _GzipCompressor:
+    def __init__(self, level: int):
+        # wbits 31 writes the gzip header and trailer
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class _BrotliCompressor:
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class _ZstdCompressor:
+    def __init__(self, level: int):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+def _compress_chunk(compressor, body: bytes, more_body: bool) -> bytes:
+    body = compressor.compress(body)
+    return body + (compressor.flush() if more_body else compressor.finish())
+
+
+class CompressionMiddleware:
+    """Compress responses with brotli, zstd or gzip, as accepted by the client.
+
+    Only bodies of at least `minimum_size` bytes whose content type starts
+    with one of `content_types` are compressed, brotli and zstd when their
+    packages are installed. Streaming responses are compressed chunk by
+    chunk. Bodies of `cache_paths` (e.g. /openapi.json) are compressed once
+    at the highest level and reused for as long as the body is unchanged.
+    Those, and bodies or chunks of at least `threadpool_min_size` bytes, are
+    compressed in the threadpool so the event loop is not blocked meanwhile.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+        zstd_level: int = 3,
+        content_types: typing.Iterable[str] = DEFAULT_COMPRESSIBLE_TYPES,
+        cache_paths: typing.Iterable[str] = (),
+        threadpool_min_size: int = 64 * 1024,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.threadpool_min_size = threadpool_min_size
+        self.content_types = tuple(content_types)
+        self.cache_paths = frozenset(cache_paths)
+        # Encoding -> (compressor factory, level, level for cached bodies),
+        # in order of preference
+        self.encodings: typing.Dict[str, typing.Tuple[typing.Callable, int, int]] = {}
+        if brotli is not None:
+            self.encodings["br"] = (_BrotliCompressor, brotli_quality, 11)
+        if zstandard is not None:
+            self.encodings["zstd"] = (_ZstdCompressor, zstd_level, 19)
+        self.encodings["gzip"] = (_GzipCompressor, gzip_level, 9)
+        # (path, encoding) -> (body digest, compressed body)
+        self._cache: typing.Dict[
+            typing.Tuple[str, str], typing.Tuple[bytes, bytes]
+        ] = {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        encoding = self.negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        responder = _CompressionResponder(self, encoding, scope["path"], send)
+        await self.app(scope, receive, responder.send)
+
+    def negotiate(self, accept_encoding: str) -> typing.Optional[str]:
+        accepted = {}
+        for part in accept_encoding.split(","):
+            name, _, params = part.partition(";")
+            quality = 1.0
+            key, _, value = params.strip().partition("=")
+            if key.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+            accepted[name.strip().lower()] = quality
+
+        best, best_quality = None, 0.0
+        for encoding in self.encodings:
+            quality = accepted.get(encoding, accepted.get("*", 0.0))
+            if quality > best_quality:
+                best, best_quality = encoding, quality
+        return best
+
+    def is_compressible(self, status_code: int, headers: MutableHeaders) -> bool:
+        if status_code < 200 or status_code in (204, 304):
+            return False
+        if "content-encoding" in headers:
+            return False
+        content_type = headers.get("content-type", "")
+        return content_type.startswith(self.content_types)
+
+    async def compress_chunk(
+        self, compressor, body: bytes, more_body: bool, offload: bool = False
+    ) -> bytes:
+        if offload or len(body) >= self.threadpool_min_size:
+            return await run_in_threadpool(_compress_chunk, compressor, body, more_body)
+        return _compress_chunk(compressor, body, more_body)
+
+    async def compress(self, encoding: str, path: str, body: bytes) -> bytes:
+        factory, level, cached_level = self.encodings[encoding]
+        if path not in self.cache_paths:
+            return await self.compress_chunk(factory(level), body, False)
+
+        digest = hashlib.blake2b(body, digest_size=16).digest()
+        cached = self._cache.get((path, encoding))
+        if cached is None or cached[0] != digest:
+            # The highest levels take long whatever the size
+            compressed = await self.compress_chunk(
+                factory(cached_level), body, False, offload=True
+            )
+            cached = (digest, compressed)
+            self._cache[(path, encoding)] = cached
+        return cached[1]
+
+
+class _CompressionResponder:
+    def __init__(
+        self, middleware: CompressionMiddleware, encoding: str, path: str, send: Send
+    ):
+        self.middleware = middleware
+        self.encoding = encoding
+        self.path = path
+        self._send = send
+        self._start: typing.Optional[typing.Dict] = None
+        self._compressor = None
+        self._passthrough = False
+
+    async def send(self, message: typing.Dict) -> None:
+        if message["type"] == "http.response.start":
+            # Held back until the first body chunk tells the size
+            self._start = message
+            return
+        if message["type"] != "http.response.body" or self._passthrough:
+            return await self._send(message)
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self._start is None:
+            # Next chunk of a compressed stream
+            body = await self.middleware.compress_chunk(
+                self._compressor, body, more_body
+            )
+            return await self._send(
+                {"type": "http.response.body", "body": body, "more_body": more_body}
+            )
+
+        start, self._start = self._start, None
+        start["headers"] = list(start.get("headers", []))
+        headers = MutableHeaders(raw=start["headers"])
+        size = len(body) if not more_body else int(headers.get("content-length", -1))
+        if not self.middleware.is_compressible(start["status"], headers) or (
+            0 <= size < self.middleware.minimum_size
+        ):
+            self._passthrough = True
+            await self._send(start)
+            return await self._send(message)
+
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        # The compressed body is a different representation
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            headers["ETag"] = f"W/{etag}"
+
+        if more_body:
+            del headers["content-length"]
+            factory, level, _ = self.middleware.encodings[self.encoding]
+            self._compressor = factory(level)
+            body = await self.middleware.compress_chunk(self._compressor, body, True)
+        else:
+            body = await self.middleware.compress(self.encoding, self.path, body)
+            headers["Content-Length"] = str(len(body))
+
+        await self._send(start)
+        await self._send(
+            {"type": "http.response.body", "body": body, "more_body": more_body}
+        )
+
+
+def add_compression_middleware(app: FastAPI) -> None:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.compression_minimum_size,
+        gzip_level=settings.compression_gzip_level,
+        brotli_quality=settings.compression_brotli_quality,
+        zstd_level=settings.compression_zstd_level,
+        cache_paths=settings.compression_cache_paths,
+        threadpool_min_size=settings.compression_threadpool_min_size,
+    )
+
+
+class AIMDLimit:
+    """Concurrency limit with additive increase and multiplicative decrease.
+
+    A request slower than `latency_target` seconds, or answered with 503/504,
+    multiplies the limit by `backoff_ratio`, at most once per `latency_target`
+    like TCP backs off once per round trip. Other requests add `1 / limit`, so
+    the limit grows by about one per window of `limit` requests, and only when
+    at least half of the limit is in use so an idle worker does not inflate it.
+    """
+
+    def __init__(
+        self,
+        initial: int = 100,
+        min_limit: int = 10,
+        max_limit: int = 1000,
+        latency_target: float = 1.0,
+        backoff_ratio: float = 0.8,
+    ):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.latency_target = latency_target
+        self.backoff_ratio = backoff_ratio
+        self.in_flight = 0
+        self._decreased_at = -math.inf
+
+    def acquire(self) -> bool:
+        if self.in_flight >= int(self.limit):
+            return False
+        self.in_flight += 1
+        return True
+
+    def release(self, latency: float, overloaded: bool = False) -> None:
+        if overloaded or latency > self.latency_target:
+            now = time.monotonic()
+            if now - self._decreased_at >= self.latency_target:
+                self._decreased_at = now
+                self.limit = max(self.min_limit, self.limit * self.backoff_ratio)
+        elif self.in_flight * 2 >= self.limit:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        self.in_flight -= 1
+
+
+class ConcurrencyLimitMiddleware:
+    """Shed load over an adaptive limit of in-flight requests with a fast 503.
+
+    Requests over `AIMDLimit` are answered at once instead of queueing for a
+    database connection, so the admitted ones still finish in time. Latency
+    includes the event loop lag, a blocked loop lowers the limit as well.
+    `exempt_paths` and paths under `priority_prefixes` are never limited.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        limit: AIMDLimit,
+        exempt_paths: typing.Iterable[str] = (),
+        priority_prefixes: typing.Iterable[str] = (),
+        retry_after: int = 1,
+    ):
+        self.app = app
+        self.limit = limit
+        self.exempt_paths = frozenset(exempt_paths)
+        self.priority_prefixes = tuple(priority_prefixes)
+        # Stateless, rendered once and sent to every shed request
+        self._rejected = responses.ORJSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"detail": "Server overloaded"},
+            headers={"Retry-After": str(retry_after)},
+        )
+        self._limit_gauge = metrics.CONCURRENCY_LIMIT.labels()
+        self._rejected_counter = metrics.CONCURRENCY_REJECTED.labels()
+        self._limit_gauge.set(int(limit.limit))
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        path = scope.get("path", "")
+        if (
+            scope["type"] != "http"
+            or path in self.exempt_paths
+            or path.startswith(self.priority_prefixes)
+        ):
+            return await self.app(scope, receive, send)
+
+        if not self.limit.acquire():
+            self._rejected_counter.inc()
+            return await self._rejected(scope, receive, send)
+
+        status_code = 500
+
+        async def send_wrapper(message: typing.MutableMapping[str, typing.Any]):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.limit.release(
+                time.perf_counter() - start,
+                overloaded=status_code
+                in (
+                    status.HTTP_503_SERVICE_UNAVAILABLE,
+                    status.HTTP_504_GATEWAY_TIMEOUT,
+                ),
+            )
+            self._limit_gauge.set(int(self.limit.limit))
+
+
+def add_concurrency_limit_middleware(app: FastAPI) -> None:
+    if settings.concurrency_limit_enabled:
+        app.add_middleware(
+            ConcurrencyLimitMiddleware,
+            limit=AIMDLimit(
+                initial=settings.concurrency_limit_initial,
+                min_limit=settings.concurrency_limit_min,
+                max_limit=settings.concurrency_limit_max,
+                latency_target=settings.concurrency_latency_target_ms / 1000,
+                backoff_ratio=settings.concurrency_backoff_ratio,
+            ),
+            exempt_paths=settings.concurrency_exempt_paths,
+            priority_prefixes=settings.concurrency_priority_prefixes,
+            retry_after=settings.concurrency_retry_after_sec,
+        )
+
+
+class MetricsMiddleware:
+    """Record latency, status codes and in-flight requests per route template.
+
+    The route is matched before the call, so the in-flight gauge is per route
+    too. Matches of routes without path params are memoized. Unmatched paths
+    share one label to keep the number of series bounded.
+    """
+
+    unmatched = "unmatched"
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self._static: typing.Dict[typing.Tuple[str, str], str] = {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        route = self._route(scope)
+        in_progress = metrics.HTTP_REQUESTS_IN_PROGRESS.labels(method, route)
+        status_code = 500
+
+        async def send_wrapper(message: typing.MutableMapping[str, typing.Any]):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            metrics.HTTP_REQUEST_DURATION.labels(method, route).observe(
+                time.perf_counter() - start
+            )
+            metrics.HTTP_REQUESTS.labels(method, route, str(status_code)).inc()
+            in_progress.dec()
+
+    def _route(self, scope: Scope) -> str:
+        key = (scope["method"], scope["path"])
+        template = self._static.get(key)
+        if template is not None:
+            return template
+
+        partial = None
+        for route in scope["app"].router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                template = route.path
+                # Mounts match any path below them, never memoize those
+                if isinstance(route, Route) and not route.param_convertors:
+                    self._static[key] = template
+                return template
+            if match == Match.PARTIAL and partial is None:
+                # Path matched with another method, 405 from the router
+                partial = route.path
+        return partial or self.unmatched
+
+
+def add_metrics_middleware(app: FastAPI) -> None:
+    if settings.metrics_enabled:
+        app.add_middleware(MetricsMiddleware)
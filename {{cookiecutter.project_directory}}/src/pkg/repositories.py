@@ -1,10 +1,126 @@
+import json
+import asyncio
+import base64
+import binascii
+import contextlib
+import itertools
 import typing
+import asyncpg
+from contextvars import ContextVar, Token
+from pydantic import BaseModel
+from tortoise import connections, timezone
+from tortoise.backends.base.client import BaseDBAsyncClient, BaseTransactionWrapper
+from tortoise.exceptions import IntegrityError, ValidationError
+from tortoise.expressions import Q
+from tortoise.fields import TimeField
 from tortoise.models import Model
 from tortoise.queryset import QuerySet
 
+from src.pkg import utils
+
 # from src.pkg import models as db_models
 
 ModelType = typing.TypeVar("ModelType", bound=Model)
+SchemaType = typing.TypeVar("SchemaType", bound=BaseModel)
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+### Read replica routing
+_read_replicas: typing.Iterator[str] = iter(())
+_has_read_replicas = False
+
+# Set once the current request (or task) has written, its reads then stay on
+# the primary so they see their own writes. Every request runs in its own
+# context; code sharing one context, like Celery tasks, uses `primary_scope`.
+_primary_pinned: ContextVar[bool] = ContextVar("primary_pinned", default=False)
+
+
+def set_read_replicas(connection_names: typing.Iterable[str]) -> None:
+    global _read_replicas, _has_read_replicas
+    names = list(connection_names)
+    _read_replicas = itertools.cycle(names)
+    _has_read_replicas = bool(names)
+
+
+def pin_primary() -> Token:
+    return _primary_pinned.set(True)
+
+
+def unpin_primary(token: typing.Optional[Token] = None) -> None:
+    """Undo `pin_primary` with its token, or let reads use replicas again."""
+    if token is None:
+        _primary_pinned.set(False)
+    else:
+        _primary_pinned.reset(token)
+
+
+@contextlib.contextmanager
+def primary_scope() -> typing.Iterator[None]:
+    """Reads start on the replicas, a write pins them until the block exits."""
+    token = _primary_pinned.set(False)
+    try:
+        yield
+    finally:
+        _primary_pinned.reset(token)
+
+
+def is_primary_pinned() -> bool:
+    return _primary_pinned.get()
+
+
+def get_read_connection(
+    default_connection: str = "default",
+) -> typing.Optional[BaseDBAsyncClient]:
+    """Next read replica in round-robin order, None when reads must use the primary."""
+    if not _has_read_replicas or _primary_pinned.get():
+        return None
+
+    # Queries inside `in_transaction()` must stay on the transaction connection
+    if isinstance(connections.get(default_connection), BaseTransactionWrapper):
+        return None
+
+    return connections.get(next(_read_replicas))
+
+
+def _json_default(value: typing.Any) -> str:
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+def encode_cursor(*values: typing.Any) -> str:
+    raw = json.dumps(values, default=_json_default, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> typing.List[typing.Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (binascii.Error, UnicodeError, ValueError):
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}")
+
+    if not isinstance(values, list):
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}")
+    return values
+
+
+_schema_fields_cache: typing.Dict[type, typing.Tuple[str, ...]] = {}
+
+
+def _schema_fields(schema: typing.Type[BaseModel]) -> typing.Tuple[str, ...]:
+    fields = _schema_fields_cache.get(schema)
+    if fields is None:
+        fields = tuple(info.alias or name for name, info in schema.model_fields.items())
+        _schema_fields_cache[schema] = fields
+    return fields
+
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
 
 
 class CRUDBase(typing.Generic[ModelType]):
@@ -14,9 +130,231 @@ class CRUDBase(typing.Generic[ModelType]):
         self.model = model
 
     async def _create(self, **kwargs: typing.Any) -> ModelType:
+        pin_primary()
         _model = await self.model.create(**kwargs)
         return _model
 
+    # Postgres accepts at most 32767 bind parameters per statement
+    _MAX_BIND_PARAMS = 32767
+
+    async def bulk_create(
+        self,
+        rows: typing.Iterable[typing.Dict[str, typing.Any]],
+        batch_size: int = 1000,
+        ignore_conflicts: bool = False,
+        returning: bool = False,
+        copy_threshold: typing.Optional[int] = 10000,
+    ) -> typing.Union[int, typing.List[typing.Any]]:
+        """Insert many rows with multi-row INSERTs, `batch_size` rows per statement.
+
+        Returns the number of inserted rows, or their primary keys if
+        `returning` is set. Batches of at least `copy_threshold` rows are
+        streamed with binary COPY instead, which cannot return primary keys.
+        """
+        on_conflict = "ON CONFLICT DO NOTHING" if ignore_conflicts else ""
+        return await self._bulk_insert(
+            rows, on_conflict, batch_size, returning, copy_threshold
+        )
+
+    async def bulk_upsert(
+        self,
+        rows: typing.Iterable[typing.Dict[str, typing.Any]],
+        conflict_fields: typing.Iterable[str],
+        update_fields: typing.Optional[typing.Iterable[str]] = None,
+        batch_size: int = 1000,
+        returning: bool = False,
+        copy_threshold: typing.Optional[int] = 10000,
+    ) -> typing.Union[int, typing.List[typing.Any]]:
+        """`bulk_create` with INSERT ... ON CONFLICT (conflict_fields) DO UPDATE.
+
+        `update_fields` defaults to the fields present in `rows`, plus
+        `auto_now` fields, without the conflict target. Missing fields would
+        be inserted with their defaults, existing rows keep their values.
+        The primary key and `auto_now_add` fields are never updated by
+        default. A conflict key may appear only once per call, a generated
+        conflict field like the pk must be set in every row.
+        """
+        meta = self.model._meta
+        projection = meta.fields_db_projection
+        conflict_fields = list(conflict_fields)
+        conflict_columns = [projection[name] for name in conflict_fields]
+        rows = list(rows)
+        present = set().union(*rows)
+        for name in conflict_fields:
+            # Generated fields left out of the rows are never inserted, the
+            # conflict could not fire
+            if meta.fields_map[name].generated and name not in present:
+                raise ValueError(f"Generated field {name!r} must be set to upsert on")
+        if update_fields is None:
+            update_fields = [
+                name
+                for name, field in meta.fields_map.items()
+                if name in projection
+                and name not in conflict_fields
+                and not field.pk
+                and not getattr(field, "auto_now_add", False)
+                and (name in present or getattr(field, "auto_now", False))
+            ]
+        update_columns = [projection[name] for name in update_fields]
+
+        target = ", ".join(map(_quote, conflict_columns))
+        if update_columns:
+            assignments = ", ".join(
+                f"{_quote(c)} = EXCLUDED.{_quote(c)}" for c in update_columns
+            )
+            on_conflict = f"ON CONFLICT ({target}) DO UPDATE SET {assignments}"
+        else:
+            on_conflict = f"ON CONFLICT ({target}) DO NOTHING"
+
+        return await self._bulk_insert(
+            rows, on_conflict, batch_size, returning, copy_threshold
+        )
+
+    def _insert_columns(
+        self, rows: typing.List[typing.Dict[str, typing.Any]]
+    ) -> typing.Tuple[typing.List[str], typing.List[str]]:
+        meta = self.model._meta
+        names = []
+        for name in meta.fields_db_projection:
+            # Generated fields, e.g. an auto-increment pk, are inserted only
+            # when the rows set them
+            if meta.fields_map[name].generated:
+                count = sum(name in row for row in rows)
+                if not count:
+                    continue
+                if count < len(rows):
+                    raise ValueError(f"Set {name!r} in every row or in none")
+            names.append(name)
+        return names, [meta.fields_db_projection[name] for name in names]
+
+    def _to_records(
+        self,
+        rows: typing.List[typing.Dict[str, typing.Any]],
+        names: typing.List[str],
+    ) -> typing.List[typing.Tuple]:
+        # Defaults and `auto_now` fields are filled in here, building a model
+        # instance per row would cost more than the INSERT itself
+        fields_map = self.model._meta.fields_map
+        now = timezone.now()
+        columns = []
+        for name in names:
+            field = fields_map[name]
+            stamp = now.time() if isinstance(field, TimeField) else now
+            columns.append(
+                (
+                    name,
+                    field.to_db_value,
+                    getattr(field, "auto_now", False),
+                    getattr(field, "auto_now_add", False),
+                    field.default,
+                    stamp,
+                )
+            )
+
+        records = []
+        for row in rows:
+            record = []
+            for name, convert, auto_now, auto_now_add, default, stamp in columns:
+                if auto_now:
+                    value = stamp
+                elif name in row:
+                    value = row[name]
+                elif auto_now_add:
+                    value = stamp
+                else:
+                    value = default() if callable(default) else default
+                record.append(convert(value, self.model))
+            records.append(tuple(record))
+        return records
+
+    async def _bulk_insert(
+        self,
+        rows: typing.Iterable[typing.Dict[str, typing.Any]],
+        on_conflict: str,
+        batch_size: int,
+        returning: bool,
+        copy_threshold: typing.Optional[int],
+    ) -> typing.Union[int, typing.List[typing.Any]]:
+        rows = list(rows)
+        names, columns = self._insert_columns(rows)
+        records = self._to_records(rows, names)
+        if not records:
+            return [] if returning else 0
+
+        pin_primary()
+        if not returning and copy_threshold and len(records) >= copy_threshold:
+            return await self._copy_insert(records, columns, on_conflict)
+
+        meta = self.model._meta
+        batch_size = max(1, min(batch_size, self._MAX_BIND_PARAMS // len(columns)))
+        prefix = (
+            f"INSERT INTO {_quote(meta.db_table)} "
+            f"({', '.join(map(_quote, columns))}) VALUES "
+        )
+        suffix = f" {on_conflict} RETURNING {_quote(meta.db_pk_column)}"
+
+        pks: typing.List[typing.Any] = []
+        iterator = iter(records)
+        while batch := list(itertools.islice(iterator, batch_size)):
+            width = len(columns)
+            values = ", ".join(
+                "(" + ", ".join(f"${i * width + j + 1}" for j in range(width)) + ")"
+                for i in range(len(batch))
+            )
+            _, result = await meta.db.execute_query(
+                prefix + values + suffix, list(itertools.chain.from_iterable(batch))
+            )
+            pks.extend(row[0] for row in result)
+
+        return pks if returning else len(pks)
+
+    async def _copy_insert(
+        self,
+        records: typing.List[typing.Tuple],
+        columns: typing.List[str],
+        on_conflict: str,
+    ) -> int:
+        table = self.model._meta.db_table
+        async with self.model._meta.db.acquire_connection() as connection:
+            try:
+                return await self._copy(
+                    connection, table, records, columns, on_conflict
+                )
+            except asyncpg.IntegrityConstraintViolationError as exc:
+                raise IntegrityError(exc)
+
+    @staticmethod
+    async def _copy(
+        connection: asyncpg.Connection,
+        table: str,
+        records: typing.List[typing.Tuple],
+        columns: typing.List[str],
+        on_conflict: str,
+    ) -> int:
+        if not on_conflict:
+            result = await connection.copy_records_to_table(
+                table, records=records, columns=columns
+            )
+            return int(result.split()[-1])
+
+        # COPY has no ON CONFLICT, stage the rows in a temporary table
+        staging = f"_bulk_{table}"
+        column_list = ", ".join(map(_quote, columns))
+        async with connection.transaction():
+            await connection.execute(
+                f"CREATE TEMP TABLE {_quote(staging)} ON COMMIT DROP AS "
+                f"SELECT {column_list} FROM {_quote(table)} WITH NO DATA"
+            )
+            await connection.copy_records_to_table(
+                staging, records=records, columns=columns
+            )
+            result = await connection.execute(
+                f"INSERT INTO {_quote(table)} ({column_list}) "
+                f"SELECT {column_list} FROM {_quote(staging)} {on_conflict}"
+            )
+            await connection.execute(f"DROP TABLE {_quote(staging)}")
+        return int(result.split()[-1])
+
     def _filter(
         self,
         lock: bool = False,
@@ -27,6 +365,10 @@ class CRUDBase(typing.Generic[ModelType]):
         model = self.model.filter(**filter)
         if lock:
             model = model.select_for_update()
+        else:
+            read_connection = get_read_connection(self.model._meta.default_connection)
+            if read_connection is not None:
+                model = model.using_db(read_connection)
 
         if prefetch:
             model = model.prefetch_related(*prefetch)
@@ -47,6 +389,14 @@ class CRUDBase(typing.Generic[ModelType]):
         _model = await model.first()
         return _model
 
+    async def filter_by_pks(
+        self, pks: typing.Iterable[typing.Any], prefetch: typing.Iterable[str] = None
+    ) -> typing.Dict[typing.Any, ModelType]:
+        pk = self.model._meta.pk_attr
+        filter: typing.Dict[str, typing.Any] = {f"{pk}__in": list(pks)}
+        _models = await self._filter(prefetch=prefetch, **filter)
+        return {_model.pk: _model for _model in _models}
+
     async def filter_many(
         self,
         lock: bool = False,
@@ -60,11 +410,329 @@ class CRUDBase(typing.Generic[ModelType]):
         _model = await model.all().offset(offset).limit(limit)
         return _model
 
+    async def filter_values(
+        self,
+        *fields: str,
+        order_by: str = None,
+        offset: int = 0,
+        limit: int = 10,
+        **filter: typing.Any,
+    ) -> typing.List[typing.Dict[str, typing.Any]]:
+        """`filter_many` returning plain dicts of `fields` instead of models."""
+        model = self._filter(order_by=order_by, **filter)
+        return await model.offset(offset).limit(limit).values(*fields)
+
+    async def filter_values_list(
+        self,
+        *fields: str,
+        flat: bool = False,
+        order_by: str = None,
+        offset: int = 0,
+        limit: int = 10,
+        **filter: typing.Any,
+    ) -> typing.List[typing.Any]:
+        """`filter_many` returning tuples of `fields` (or bare values if `flat`)."""
+        model = self._filter(order_by=order_by, **filter)
+        return await model.offset(offset).limit(limit).values_list(*fields, flat=flat)
+
+    async def filter_schema(
+        self,
+        schema: typing.Type[SchemaType],
+        order_by: str = None,
+        offset: int = 0,
+        limit: int = 10,
+        **filter: typing.Any,
+    ) -> typing.List[SchemaType]:
+        """Select only the fields of `schema` and validate the rows straight into it.
+
+        Schema field names, or their aliases, must match model field names.
+        """
+        model = self._filter(order_by=order_by, **filter)
+        fields = _schema_fields(schema)
+        rows = await model.offset(offset).limit(limit).values(*fields)
+        return utils.list_adapter(schema).validate_python(rows)
+
+    async def iter_batches(
+        self,
+        batch_size: int = 1000,
+        prefetch: typing.Iterable[str] = None,
+        order_by: str = None,
+        **filter: typing.Any,
+    ) -> typing.AsyncGenerator[typing.List[ModelType], None]:
+        """Yield lists of at most `batch_size` models from a server-side cursor.
+
+        Only one batch is held in memory at a time. The cursor keeps a
+        connection and a read transaction open until the generator finishes,
+        wrap it in `contextlib.aclosing` when the loop may stop early, or the
+        connection idles in transaction until garbage collection.
+        """
+        queryset = self._filter(order_by=order_by, **filter)
+        sql = queryset.sql()
+        # `sql()` settles the connection, the replica `_filter` picked if any
+        async with queryset._db.acquire_connection() as connection:
+            async with connection.transaction(readonly=True):
+                cursor = await connection.cursor(sql)
+                while records := await cursor.fetch(batch_size):
+                    _models = [self.model._init_from_db(**record) for record in records]
+                    if prefetch:
+                        await self.model.fetch_for_list(_models, *prefetch)
+                    yield _models
+
+    async def stream(
+        self,
+        batch_size: int = 1000,
+        prefetch: typing.Iterable[str] = None,
+        order_by: str = None,
+        **filter: typing.Any,
+    ) -> typing.AsyncGenerator[ModelType, None]:
+        """`iter_batches` one model at a time, wrap it in `contextlib.aclosing` too."""
+        batches = self.iter_batches(batch_size, prefetch, order_by, **filter)
+        async with contextlib.aclosing(batches):
+            async for _models in batches:
+                for _model in _models:
+                    yield _model
+
+    async def filter_keyset(
+        self,
+        cursor: typing.Optional[str] = None,
+        prefetch: typing.Iterable[str] = None,
+        order_by: str = None,
+        limit: int = 10,
+        **filter: typing.Any,
+    ) -> typing.Tuple[typing.List[ModelType], typing.Optional[str]]:
+        """Keyset pagination, seeking past the last row instead of using OFFSET.
+
+        `order_by` must be a single non-null, indexed field ("-" for descending),
+        the primary key breaks ties. Returns the page and the cursor of the next
+        page, which is None on the last page.
+        """
+        pk = self.model._meta.pk_attr
+        field = order_by.lstrip("-") if order_by else pk
+        sign = "-" if order_by and order_by.startswith("-") else ""
+
+        model = self._filter(prefetch=prefetch, **filter)
+        if cursor:
+            model = self._seek(model, field, sign, decode_cursor(cursor))
+
+        ordering = (
+            [f"{sign}{field}"] if field == pk else [f"{sign}{field}", f"{sign}{pk}"]
+        )
+        _models = await model.order_by(*ordering).limit(limit + 1)
+
+        next_cursor = None
+        if len(_models) > limit:
+            _models = _models[:limit]
+            last = _models[-1]
+            next_cursor = encode_cursor(getattr(last, field), last.pk)
+
+        return _models, next_cursor
+
+    def _seek(
+        self, model: QuerySet, field: str, sign: str, values: typing.List[typing.Any]
+    ) -> QuerySet:
+        fields_map = self.model._meta.fields_map
+        pk = self.model._meta.pk_attr
+        try:
+            value, last_pk = values
+            value = fields_map[field].to_python_value(value)
+            last_pk = fields_map[pk].to_python_value(last_pk)
+        except (TypeError, ValueError, ValidationError):
+            raise InvalidCursor(f"Invalid cursor values: {values!r}")
+
+        op = "lt" if sign else "gt"
+        if field == pk:
+            return model.filter(**{f"{pk}__{op}": last_pk})
+
+        # `field >= value` bounds the index range scan, the OR breaks ties
+        return model.filter(**{f"{field}__{op}e": value}).filter(
+            Q(**{f"{field}__{op}": value}) | Q(**{f"{pk}__{op}": last_pk})
+        )
+
     async def select_update(
         self, update_schema: typing.Dict, **filter: typing.Any
     ) -> int:
+        pin_primary()
         return (
             await self.model.filter(**filter)
             .select_for_update()
             .update(**update_schema)
         )
+
+    async def bulk_update(
+        self,
+        updates: typing.Mapping[typing.Any, typing.Mapping[str, typing.Any]],
+        batch_size: int = 1000,
+        version_field: typing.Optional[str] = None,
+        returning: bool = False,
+    ) -> typing.Union[int, typing.List[typing.Any]]:
+        """Apply `{pk: {field: value}}` updates with UPDATE ... FROM unnest(...).
+
+        Rows are grouped by the set of fields they change, each group is sent
+        as one statement per `batch_size` rows. `auto_now` fields are set on
+        every updated row. With `version_field`, every update must carry the
+        version it was read at; rows whose version has moved on are skipped
+        instead of locked, and the version of the updated rows is incremented.
+        Returns the number of updated rows, or their primary keys if
+        `returning` is set; the pks left out were stale or missing.
+        """
+        meta = self.model._meta
+        auto_now = [
+            name
+            for name, field in meta.fields_map.items()
+            if getattr(field, "auto_now", False) and name in meta.fields_db_projection
+        ]
+        groups: typing.Dict[typing.Tuple[str, ...], typing.List] = {}
+        for pk, values in updates.items():
+            if version_field is not None and version_field not in values:
+                raise ValueError(f"Missing {version_field!r} for pk {pk!r}")
+            changed = {name for name in values if name != version_field}
+            if changed:
+                changed.update(auto_now)
+            groups.setdefault(tuple(sorted(changed)), []).append((pk, values))
+
+        pin_primary()
+        pks: typing.List[typing.Any] = []
+        for fields, rows in groups.items():
+            names = list(fields) + ([version_field] if version_field else [])
+            if not names:
+                continue
+
+            sql = self._bulk_update_sql(fields, version_field)
+            to_db = [
+                (name, meta.fields_map[name].to_db_value)
+                for name in [meta.pk_attr, *names]
+            ]
+            for start in range(0, len(rows), batch_size):
+                batch = rows[start : start + batch_size]
+                # Some fields read the instance to convert their value, e.g.
+                # `auto_now`, which sets the current time
+                instances = [
+                    self.model(**{meta.pk_attr: pk, **values}) for pk, values in batch
+                ]
+                columns = [
+                    [
+                        convert(getattr(instance, name), instance)
+                        for instance in instances
+                    ]
+                    for name, convert in to_db
+                ]
+                # `execute_query` discards the rows of UPDATE statements
+                result = await meta.db.execute_query_dict(sql, columns)
+                pks.extend(row[meta.db_pk_column] for row in result)
+
+        return pks if returning else len(pks)
+
+    def _bulk_update_sql(
+        self, fields: typing.Tuple[str, ...], version_field: typing.Optional[str]
+    ) -> str:
+        meta = self.model._meta
+        names = [meta.pk_attr, *fields] + ([version_field] if version_field else [])
+        # One typed array per column, so the statement has a fixed number of
+        # parameters whatever the batch size
+        arrays = ", ".join(
+            f"${i + 1}::{meta.fields_map[name].get_for_dialect('postgres', 'SQL_TYPE')}[]"
+            for i, name in enumerate(names)
+        )
+        aliases = [f"c{i}" for i in range(len(names))]
+        assignments = [
+            f"{_quote(meta.fields_db_projection[name])} = v.{alias}"
+            for name, alias in zip(fields, aliases[1:])
+        ]
+        condition = f"t.{_quote(meta.db_pk_column)} = v.c0"
+        if version_field:
+            version = _quote(meta.fields_db_projection[version_field])
+            assignments.append(f"{version} = t.{version} + 1")
+            condition += f" AND t.{version} = v.{aliases[-1]}"
+
+        return (
+            f"UPDATE {_quote(meta.db_table)} AS t SET {', '.join(assignments)} "
+            f"FROM unnest({arrays}) AS v({', '.join(aliases)}) WHERE {condition} "
+            f"RETURNING t.{_quote(meta.db_pk_column)}"
+        )
+
+
+class DataLoader(typing.Generic[ModelType]):
+    """Batch and memoize primary-key lookups.
+
+    `load` calls made in the same event-loop tick are sent as one
+    `WHERE pk IN (...)` query, and every result is cached for the lifetime of
+    the loader. Call `clear` after writing to a loaded row.
+    """
+
+    __slots__ = ("_crud", "_pk_field", "_cache", "_queue", "_tasks")
+
+    def __init__(self, crud: CRUDBase[ModelType]):
+        self._crud = crud
+        self._pk_field = crud.model._meta.pk
+        self._cache: typing.Dict[typing.Any, asyncio.Future] = {}
+        self._queue: typing.Dict[typing.Any, asyncio.Future] = {}
+        self._tasks: typing.Set[asyncio.Task] = set()
+
+    def load(self, pk: typing.Any) -> "asyncio.Future[typing.Optional[ModelType]]":
+        pk = self._pk_field.to_python_value(pk)
+        future = self._cache.get(pk)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self._cache[pk] = loop.create_future()
+            if not self._queue:
+                loop.call_soon(self._dispatch)
+            self._queue[pk] = future
+        return future
+
+    async def load_many(
+        self, pks: typing.Iterable[typing.Any]
+    ) -> typing.List[typing.Optional[ModelType]]:
+        return await asyncio.gather(*(self.load(pk) for pk in pks))
+
+    def prime(self, _model: ModelType) -> None:
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(_model)
+        self._cache[_model.pk] = future
+
+    def clear(self, pk: typing.Any = None) -> None:
+        if pk is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(self._pk_field.to_python_value(pk), None)
+
+    def _dispatch(self) -> None:
+        queue, self._queue = self._queue, {}
+        task = asyncio.create_task(self._batch_load(queue))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _batch_load(self, queue: typing.Dict[typing.Any, asyncio.Future]) -> None:
+        try:
+            _models = await self._crud.filter_by_pks(queue.keys())
+            results = {pk: _models.get(pk) for pk in queue}
+        except Exception as exc:
+            for pk, future in queue.items():
+                # Failed lookups are not memoized
+                if self._cache.get(pk) is future:
+                    del self._cache[pk]
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        for pk, future in queue.items():
+            if not future.done():
+                future.set_result(results[pk])
+
+
+class DataLoaderRegistry:
+    """Per-request DataLoaders, one per model."""
+
+    __slots__ = ("_loaders",)
+
+    def __init__(self):
+        self._loaders: typing.Dict[typing.Type[Model], DataLoader] = {}
+
+    def get(self, model: typing.Type[ModelType]) -> DataLoader[ModelType]:
+        loader = self._loaders.get(model)
+        if loader is None:
+            loader = self._loaders[model] = DataLoader(CRUDBase(model))
+        return loader
+
+    def clear(self) -> None:
+        for loader in self._loaders.values():
+            loader.clear()
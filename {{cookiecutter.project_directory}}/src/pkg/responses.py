@@ -0,0 +1,73 @@
+import typing
+import decimal
+import orjson
+import pydantic_core
+from fastapi import responses
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from starlette.background import BackgroundTask
+
+from src.pkg import utils
+
+
+def _default(value: typing.Any) -> typing.Any:
+    # Types orjson does not serialize natively
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, decimal.Decimal):
+        # As a string like pydantic, a float would lose precision
+        return str(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+class ORJSONResponse(responses.ORJSONResponse):
+    """FastAPI's ORJSONResponse that also encodes models, Decimal and sets."""
+
+    def render(self, content: typing.Any) -> bytes:
+        return orjson.dumps(
+            content,
+            default=_default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY,
+        )
+
+
+class PydanticResponse(JSONResponse):
+    """Serialize Pydantic models straight to JSON bytes with pydantic-core.
+
+    Return it from a route instead of the models to skip `jsonable_encoder`
+    and the intermediate dicts. `content` may be a model, a list of models or
+    any JSON value containing models.
+    """
+
+    def __init__(
+        self,
+        content: typing.Any,
+        status_code: int = 200,
+        headers: typing.Optional[typing.Mapping[str, str]] = None,
+        media_type: typing.Optional[str] = None,
+        background: typing.Optional[BackgroundTask] = None,
+        *,
+        by_alias: bool = True,
+        exclude_none: bool = False,
+    ):
+        self.by_alias = by_alias
+        self.exclude_none = exclude_none
+        super().__init__(content, status_code, headers, media_type, background)
+
+    def render(self, content: typing.Any) -> bytes:
+        options = {"by_alias": self.by_alias, "exclude_none": self.exclude_none}
+        if isinstance(content, BaseModel):
+            return content.__pydantic_serializer__.to_json(content, **options)
+
+        # A list of one model class is serialized in one call with a cached
+        # adapter, a bit faster than inferring the type of every item
+        if isinstance(content, list) and content:
+            model = type(content[0])
+            if issubclass(model, BaseModel) and all(
+                type(item) is model for item in content
+            ):
+                return utils.list_adapter(model).dump_json(content, **options)
+
+        return pydantic_core.to_json(content, **options)
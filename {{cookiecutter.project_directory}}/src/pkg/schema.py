@@ -19,6 +19,28 @@ class EnvironmentMode(str, Enum):
     testing = "testing"
 
 
+class ExecutorKind(str, Enum):
+    thread = "thread"
+    process = "process"
+
+
+class RateLimitPrincipal(str, Enum):
+    ip = "ip"
+    api_key = "api_key"
+    jwt_sub = "jwt_sub"
+
+
+class CacheSerializer(str, Enum):
+    json = "json"
+    msgpack = "msgpack"
+
+
+class CacheCompression(str, Enum):
+    none = "none"
+    zlib = "zlib"
+    lz4 = "lz4"
+
+
 class UserCreate(BaseModel):
     email: str = Field(max_length=255)
     password: str = Field(max_length=255)
@@ -1,8 +1,18 @@
 import sys
+import json
+import math
+import time
+import random
 import typing
+import asyncio
+import orjson
 import aioredis
 import socket
 import secrets
+import hashlib
+import traceback
+import threading
+import queue
 
 # import httpx
 # import asyncio
@@ -13,7 +23,9 @@ import secrets
 #     before_log,
 #     retry_if_exception_type,
 # )
-from datetime import datetime, timedelta
+from contextlib import suppress
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta, time as datetime_time
 from aioredis.exceptions import ConnectionError
 from pathlib import Path
 from loguru import logger
@@ -25,37 +37,175 @@ from jose import JWTError, jwt
 from passlib.context import CryptContext
 from pydantic import ValidationError
 
-from src.pkg import schema, utils
+from src.pkg import metrics, schema, utils
+from src.pkg.codec import CacheCodec
+
+
+def _json_line(record: typing.Dict[str, typing.Any]) -> str:
+    # Format function of the JSON sinks. The line is rendered once per record
+    # and shared by the sinks through `extra`, the template only inserts it.
+    extra = record["extra"]
+    if "_json" not in extra:
+        payload = {
+            "time": record["time"].isoformat(),
+            "level": record["level"].name,
+            "name": record["name"],
+            "function": record["function"],
+            "line": record["line"],
+            "message": record["message"],
+        }
+        if extra:
+            payload["extra"] = extra
+        if record["exception"] is not None:
+            payload["exception"] = "".join(
+                traceback.format_exception(*record["exception"])
+            )
+        extra["_json"] = orjson.dumps(payload, default=str).decode()
+    return "{extra[_json]}\n"
+
+
+def _sampling_filter(
+    sampling: typing.Dict[str, float],
+) -> typing.Callable[[typing.Dict[str, typing.Any]], bool]:
+    rates = {schema.LogLevel(level).value: rate for level, rate in sampling.items()}
+
+    def sample(record: typing.Dict[str, typing.Any]) -> bool:
+        rate = rates.get(record["level"].name)
+        return rate is None or random.random() < rate
+
+    return sample
+
+
+class _DailyFile:
+    """Log file renamed with a timestamp and reopened every day at `at`."""
+
+    def __init__(self, path: Path, at: datetime_time):
+        self.path = path
+        self.at = at
+        self._open()
+
+    def _open(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf8")
+        now = datetime.now()
+        rotate_at = datetime.combine(now.date(), self.at)
+        if rotate_at <= now:
+            rotate_at += timedelta(days=1)
+        self._rotate_at = rotate_at.timestamp()
+
+    def write(self, message: str) -> None:
+        if time.time() >= self._rotate_at:
+            self._file.close()
+            stamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+            self.path.rename(
+                self.path.with_name(f"{self.path.stem}.{stamp}{self.path.suffix}")
+            )
+            self._open()
+        self._file.write(message)
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class _QueueSink:
+    """Loguru sink handing the formatted messages to a writer thread.
+
+    The caller only pays for the formatting and a `SimpleQueue.put`, unlike
+    loguru's `enqueue` which pickles every record through a pipe. The thread
+    writes whatever is queued and flushes once per batch. `stop` is called by
+    `logger.remove` and returns once the queue is drained.
+    """
+
+    def __init__(self, stream: typing.Any, close: bool = False):
+        self._stream = stream
+        self._close = close
+        self._queue: "queue.SimpleQueue[typing.Optional[str]]" = queue.SimpleQueue()
+        self._thread = threading.Thread(
+            target=self._run, name="log-writer", daemon=True
+        )
+        self._thread.start()
+
+    def write(self, message: str) -> None:
+        self._queue.put(message)
+
+    def _run(self) -> None:
+        while True:
+            message = self._queue.get()
+            while message is not None:
+                self._stream.write(message)
+                try:
+                    message = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            self._stream.flush()
+            if message is None:
+                return
+
+    def stop(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+        if self._close:
+            self._stream.close()
 
 
 class LoggerInit(resources.Resource):
+    """Log to stdout and to a file rotated daily.
+
+    With `enqueue` the sinks are written by a background thread, callers only
+    format the record, see `_QueueSink`. `json_format` writes compact JSON lines. `sampling`
+    keeps that fraction of the records of a level, e.g. {"DEBUG": 0.01}.
+    Pass values as arguments, `logger.debug("... {}", value)`, so that
+    messages below the active levels are never built.
+    """
+
     def init(
         self,
         app_name: str,
         log_path: str,
         show_log_level: schema.LogLevel = schema.LogLevel.debug,
         write_log_level: schema.LogLevel = schema.LogLevel.warning,
+        enqueue: bool = False,
+        json_format: bool = False,
+        sampling: typing.Optional[typing.Dict[str, float]] = None,
     ) -> None:
         logger.remove()
+        log_filter = _sampling_filter(sampling) if sampling else None
 
         logger.add(
-            sys.stdout,
-            colorize=True,
-            format="<green>{time:YYYY-MM-DDTHH:mm:ss}</green> | [<level>{level}</level>] | <c>{file}::{function}::{line}</c> | {message}",
+            _QueueSink(sys.stdout) if enqueue else sys.stdout,
+            colorize=not json_format,
+            format=_json_line
+            if json_format
+            else "<green>{time:YYYY-MM-DDTHH:mm:ss}</green> | [<level>{level}</level>] | <c>{file}::{function}::{line}</c> | {message}",
             level=show_log_level,
+            filter=log_filter,
         )
 
         new_log_path = Path(log_path) / f"{app_name}.log"
-        logger.info(f"Save log to {str(new_log_path)}")
+        logger.info("Save log to {}", new_log_path)
+        file_sink: typing.Union[str, _QueueSink]
+        if enqueue:
+            file_sink = _QueueSink(_DailyFile(new_log_path, datetime_time(12)), True)
+            file_options = {}
+        else:
+            file_sink = str(new_log_path)
+            file_options = {"rotation": "12:00"}
         logger.add(
-            str(new_log_path),
+            file_sink,
             colorize=False,
-            format="{time:YYYY-MM-DD at HH:mm:ss} | [<level>{level}</level>] | <c>{file}::{function}::{line}</c>  | {message}",
-            rotation="12:00",
+            format=_json_line
+            if json_format
+            else "{time:YYYY-MM-DD at HH:mm:ss} | [<level>{level}</level>] | <c>{file}::{function}::{line}</c>  | {message}",
             level=write_log_level,
+            filter=log_filter,
+            **file_options,
         )
 
     def shutdown(self, *args: typing.Any, **kwargs: typing.Any) -> None:
+        # Waits for the queued records to be written
         logger.remove()
 
 
@@ -95,7 +245,7 @@ class JWTHandler:
             return payload
 
         except JWTError as e:
-            logger.info(f"JWT Error: {e}")
+            logger.info("JWT Error: {}", e)
             return None
 
     def encode(self, payload: typing.Dict) -> str:
@@ -110,9 +260,108 @@ class JWTHandler:
         return self._expired_time_minute * 60
 
 
+class PasswordHashExecutor(resources.Resource):
+    def init(
+        self,
+        kind: schema.ExecutorKind = schema.ExecutorKind.thread,
+        max_workers: int = 2,
+    ) -> Executor:
+        executor: Executor
+        if kind == schema.ExecutorKind.process:
+            executor = ProcessPoolExecutor(max_workers=max_workers)
+        else:
+            executor = ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix="password-hash"
+            )
+        logger.debug("Password hash executor initialized ({}, {})", kind, max_workers)
+        return executor
+
+    def shutdown(self, executor: Executor) -> None:
+        executor.shutdown(wait=False)
+        logger.debug("Password hash executor shutdown")
+
+
+class PasswordHasher:
+    """Run blocking hash functions on an executor, at most `max_concurrency` at once.
+
+    Callers over the cap wait on a semaphore instead of piling work onto the
+    executor, `waiting` is the current queue depth. The counts are exported
+    as the `password_hash_*` metrics too.
+    """
+
+    __slots__ = (
+        "_executor",
+        "_max_concurrency",
+        "_semaphore",
+        "_loop",
+        "waiting",
+        "running",
+        "completed",
+    )
+
+    def __init__(
+        self, executor: typing.Optional[Executor] = None, max_concurrency: int = 2
+    ) -> None:
+        self._executor = executor
+        self._max_concurrency = max_concurrency
+        self._semaphore: typing.Optional[asyncio.Semaphore] = None
+        self._loop: typing.Optional[asyncio.AbstractEventLoop] = None
+        self.waiting = 0
+        self.running = 0
+        self.completed = 0
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Celery tasks run each coroutine on a new loop through async_to_sync
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        return self._semaphore
+
+    async def run(self, func: typing.Callable[..., typing.Any], *args: typing.Any):
+        semaphore = self._get_semaphore()
+        waiting = metrics.PASSWORD_HASH_WAITING.labels()
+        running = metrics.PASSWORD_HASH_RUNNING.labels()
+        self.waiting += 1
+        waiting.inc()
+        try:
+            await semaphore.acquire()
+        finally:
+            self.waiting -= 1
+            waiting.dec()
+
+        self.running += 1
+        running.inc()
+        try:
+            return await self._loop.run_in_executor(self._executor, func, *args)
+        finally:
+            self.running -= 1
+            self.completed += 1
+            running.dec()
+            metrics.PASSWORD_HASH_COMPLETED.labels().inc()
+            semaphore.release()
+
+    def stats(self) -> typing.Dict[str, int]:
+        return {
+            "max_concurrency": self._max_concurrency,
+            "waiting": self.waiting,
+            "running": self.running,
+            "completed": self.completed,
+        }
+
+
 class BaseAuthService:
     pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+    __slots__ = ("_password_hasher",)
+
+    def __init__(self, password_hasher: typing.Optional[PasswordHasher] = None):
+        self._password_hasher = password_hasher or PasswordHasher()
+
+    @property
+    def password_hasher(self) -> PasswordHasher:
+        return self._password_hasher
+
     @classmethod
     def verify_password(cls, plain_password: str, hashed_password: str) -> bool:
         return cls.pwd_context.verify(plain_password, hashed_password)
@@ -121,16 +370,50 @@ class BaseAuthService:
     def get_password_hash(cls, password: str) -> str:
         return cls.pwd_context.hash(password)
 
+    # bcrypt takes hundreds of milliseconds, use these from async code
+    async def verify_password_async(
+        self, plain_password: str, hashed_password: str
+    ) -> bool:
+        return await self._password_hasher.run(
+            self.verify_password, plain_password, hashed_password
+        )
+
+    async def get_password_hash_async(self, password: str) -> str:
+        return await self._password_hasher.run(self.get_password_hash, password)
+
 
 class AuthService(BaseAuthService):
-    __slots__ = ("_jwt_handler", "_admin_username", "_admin_password")
+    __slots__ = (
+        "_jwt_handler",
+        "_admin_username",
+        "_admin_password",
+        "_token_cache",
+        "_token_cache_ttl",
+        "_token_cache_lock",
+    )
 
     def __init__(
-        self, jwt_handler: JWTHandler, admin_username: str, admin_password: str
+        self,
+        jwt_handler: JWTHandler,
+        admin_username: str,
+        admin_password: str,
+        token_cache_size: int = 1024,
+        token_cache_ttl: int = 300,
+        password_hasher: typing.Optional[PasswordHasher] = None,
     ) -> None:
+        super().__init__(password_hasher)
         self._jwt_handler = jwt_handler
         self._admin_username = admin_username
         self._admin_password = admin_password
+        # Verified tokens -> (JWTUser, scopes), keyed by the token digest.
+        # Cached users are shared between requests, treat them as read-only.
+        self._token_cache: utils.LRUCache[
+            bytes, typing.Tuple[schema.JWTUser, typing.FrozenSet[str]]
+        ] = utils.LRUCache(maxsize=token_cache_size)
+        self._token_cache_ttl = token_cache_ttl
+        # The sync dependencies run in the threadpool, `LRUCache` is not
+        # thread-safe
+        self._token_cache_lock = threading.Lock()
 
     @property
     def admin_username(self) -> str:
@@ -146,9 +429,19 @@ class AuthService(BaseAuthService):
 
         return self._admin_password
 
-    def authenticate_jwt(
-        self, token: str, security_scopes: SecurityScopes
-    ) -> schema.JWTUser:
+    @property
+    def token_cache(self) -> utils.LRUCache:
+        return self._token_cache
+
+    def _verify_jwt(
+        self, token: str
+    ) -> typing.Tuple[schema.JWTUser, typing.FrozenSet[str]]:
+        key = hashlib.sha256(token.encode("utf8")).digest()
+        with self._token_cache_lock:
+            cached = self._token_cache.get(key)
+        if cached is not None:
+            return cached
+
         # Decode JWT
         payload = self._jwt_handler.decode(token)
         if payload is None:
@@ -158,18 +451,42 @@ class AuthService(BaseAuthService):
                 headers={"WWW-Authenticate": "Bearer"},
             )
 
-        user_scopes = payload.get("scopes", [])
-
         try:
             user = schema.JWTUser.model_validate(payload)
         except ValidationError as e:
-            logger.info(f"Model Validation Error: {e}")
+            logger.info("Model Validation Error: {}", e)
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Could not validate credentials",
                 headers={"WWW-Authenticate": "Bearer"},
             )
 
+        verified = (user, frozenset(payload.get("scopes", [])))
+
+        # Never keep a token around longer than it is valid
+        ttl: float = self._token_cache_ttl
+        expired_at = payload.get("exp")
+        if isinstance(expired_at, (int, float)):
+            ttl = min(ttl, expired_at - time.time())
+        with self._token_cache_lock:
+            self._token_cache.set(key, verified, ttl=ttl)
+
+        return verified
+
+    def get_jwt_user(
+        self, token: str
+    ) -> typing.Optional[typing.Tuple[schema.JWTUser, typing.FrozenSet[str]]]:
+        """The user and scopes of a valid token, None instead of a 401."""
+        try:
+            return self._verify_jwt(token)
+        except HTTPException:
+            return None
+
+    def authenticate_jwt(
+        self, token: str, security_scopes: SecurityScopes
+    ) -> schema.JWTUser:
+        user, user_scopes = self._verify_jwt(token)
+
         if security_scopes.scopes:
             authenticate_value = f'Bearer scope="{security_scopes.scope_str}"'
         else:
@@ -200,6 +517,22 @@ class AuthService(BaseAuthService):
             return False
         return True
 
+    async def authenticate_admin_async(self, credentials: HTTPBasicCredentials) -> bool:
+        """`authenticate_admin`, also accepting a bcrypt hash as admin password.
+
+        The hash is verified on the password hasher, off the event loop.
+        """
+        if not self.pwd_context.identify(self._admin_password, required=False):
+            return self.authenticate_admin(credentials)
+
+        is_correct_username = secrets.compare_digest(
+            credentials.username.encode("utf8"), self._admin_username.encode("utf8")
+        )
+        is_correct_password = await self.verify_password_async(
+            credentials.password, self._admin_password
+        )
+        return is_correct_username and is_correct_password
+
     def create_jwt_token(self, *, user_id: str, scopes: typing.Iterable) -> str:
         payload = schema.JWTUser(sub=user_id, scopes=scopes).model_dump(
             mode="json", by_alias=True
@@ -241,9 +574,597 @@ class DBService(BaseDatabaseService):
         super().__init__()
 
 
+class ReadinessService:
+    """Run the readiness checks concurrently and cache the aggregate result.
+
+    Every check gets `timeout_ms`. A result younger than `ttl_ms` is returned
+    as is, an older one is returned while a single background task refreshes
+    it. Past `ttl_ms + timeout_ms` that refresh should be done, so callers wait
+    for it rather than get an outdated result, but they still share it.
+    """
+
+    def __init__(
+        self,
+        checks: typing.Dict[str, typing.Callable[[], typing.Awaitable[bool]]],
+        timeout_ms: int = 1000,
+        ttl_ms: int = 1000,
+    ):
+        self.checks = checks
+        self.timeout = timeout_ms / 1000
+        self.ttl = ttl_ms / 1000
+        self._result: typing.Optional[typing.Dict[str, typing.Any]] = None
+        self._checked_at = 0.0
+        self._refresh: typing.Optional[asyncio.Task] = None
+
+    async def check(self) -> typing.Dict[str, typing.Any]:
+        age = time.monotonic() - self._checked_at
+        if self._result is not None and age < self.ttl:
+            return self._result
+
+        task = self._refresh
+        if task is None:
+            task = self._refresh = asyncio.create_task(self._run())
+            task.add_done_callback(self._refreshed)
+        if self._result is not None and age < self.ttl + self.timeout:
+            return self._result
+        # A cancelled probe must not cancel the refresh shared with the others
+        return await asyncio.shield(task)
+
+    def _refreshed(self, task: asyncio.Task) -> None:
+        self._refresh = None
+
+    async def _run(self) -> typing.Dict[str, typing.Any]:
+        names = list(self.checks)
+        results = await asyncio.gather(
+            *(self._run_check(self.checks[name]) for name in names)
+        )
+        checks = dict(zip(names, results))
+        self._result = {
+            "ready": all(check["ok"] for check in checks.values()),
+            "checks": checks,
+        }
+        self._checked_at = time.monotonic()
+        return self._result
+
+    async def _run_check(
+        self, check: typing.Callable[[], typing.Awaitable[bool]]
+    ) -> typing.Dict[str, typing.Any]:
+        start = time.perf_counter()
+        error = None
+        try:
+            ok = bool(await asyncio.wait_for(check(), self.timeout))
+        except asyncio.TimeoutError:
+            ok, error = False, "timeout"
+        except Exception as exc:
+            ok, error = False, repr(exc)
+
+        result: typing.Dict[str, typing.Any] = {
+            "ok": ok,
+            "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+        }
+        if error is not None:
+            result["error"] = error
+        return result
+
+
+_MISSING = object()
+
+
+class RedisBatcher:
+    """Send the Redis commands issued within one event-loop tick as one pipeline.
+
+    `execute` queues a command and returns a future for its reply, the queue
+    is flushed on the next loop iteration or once it holds `max_batch_size`
+    commands. Commands run in the order they were queued, without MULTI.
+    `close` sends what is queued and waits for the pipelines in flight.
+    """
+
+    def __init__(self, client: aioredis.Redis, max_batch_size: int = 512):
+        self.client = client
+        self.max_batch_size = max_batch_size
+        self._queue: typing.List[typing.Tuple[typing.Tuple, asyncio.Future]] = []
+        self._handle: typing.Optional[asyncio.Handle] = None
+        # The loop only keeps weak references to tasks
+        self._tasks: typing.Set[asyncio.Task] = set()
+        self.commands = 0
+        self.batches = 0
+
+    def execute(self, *args: typing.Any) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.append((args, future))
+        if len(self._queue) >= self.max_batch_size:
+            self.flush()
+        elif self._handle is None:
+            self._handle = loop.call_soon(self.flush)
+        return future
+
+    def flush(self) -> None:
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        queue, self._queue = self._queue, []
+        if queue:
+            task = asyncio.ensure_future(self._send(queue))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def close(self) -> None:
+        self.flush()
+        results = await asyncio.gather(*self._tasks, return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                logger.warning("[Cache]::Pipeline failed: {}", result)
+
+    async def _send(
+        self, queue: typing.List[typing.Tuple[typing.Tuple, asyncio.Future]]
+    ) -> None:
+        self.commands += len(queue)
+        self.batches += 1
+        pipe = self.client.pipeline(transaction=False)
+        for args, _ in queue:
+            pipe.execute_command(*args)
+        start = time.perf_counter()
+        try:
+            results = await pipe.execute(raise_on_error=False)
+        except Exception as exc:
+            results = [exc] * len(queue)
+        metrics.REDIS_COMMAND_DURATION.labels("PIPELINE").observe(
+            time.perf_counter() - start
+        )
+
+        for (_, future), result in zip(queue, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def stats(self) -> typing.Dict[str, int]:
+        return {
+            "queued": len(self._queue),
+            "commands": self.commands,
+            "batches": self.batches,
+        }
+
+
+# Delete a lock only if it is still held by the caller's token
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
 class CacheService(BaseCacheService):
-    def __init__(self, client: aioredis.Redis):
+    """Two-tier cache, a bounded in-process LRU in front of Redis.
+
+    Values are encoded with `codec`. Writes and deletes are published on `channel`
+    so the other workers drop their local copies, see
+    `CacheInvalidationListener`. Local entries live at most `local_ttl`
+    seconds, which bounds staleness if an invalidation message is lost.
+    Values served from the local tier are shared, do not mutate them.
+    """
+
+    def __init__(
+        self,
+        client: aioredis.Redis,
+        codec: typing.Optional[CacheCodec] = None,
+        local_cache_size: int = 10000,
+        local_cache_max_bytes: int = 64 * 1024 * 1024,
+        local_ttl: float = 60.0,
+        channel: str = "cache:invalidate",
+        pipeline_max_batch_size: int = 512,
+    ):
         super().__init__(client)
+        self.codec = codec or CacheCodec()
+        self.batcher = RedisBatcher(client, max_batch_size=pipeline_max_batch_size)
+        self.local: utils.LRUCache[str, typing.Any] = utils.LRUCache(
+            maxsize=local_cache_size, ttl=local_ttl, max_bytes=local_cache_max_bytes
+        )
+        self.local_ttl = local_ttl
+        self.channel = channel
+        self.node_id = secrets.token_hex(8)
+        # Bumped on every invalidation, a Redis read that raced with one is
+        # returned but not kept locally
+        self._generation = 0
+        self._inflight: typing.Dict[str, asyncio.Future] = {}
+        self._release_lock = client.register_script(RELEASE_LOCK_SCRIPT)
+
+    def _local_ttl(self, ttl_ms: typing.Optional[int]) -> typing.Optional[float]:
+        # Never keep a local copy longer than the Redis key lives
+        if ttl_ms is None or ttl_ms < 0:
+            return None
+        return min(ttl_ms / 1000, self.local_ttl)
+
+    async def get(self, key: str, default: typing.Any = None) -> typing.Any:
+        value = self.local.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        return (await self.mget([key])).get(key, default)
+
+    async def mget(self, keys: typing.Iterable[str]) -> typing.Dict[str, typing.Any]:
+        """Return the cached values of `keys`, keys without a value are left out."""
+        values = {}
+        missing = []
+        for key in keys:
+            value = self.local.get(key, _MISSING)
+            if value is _MISSING:
+                missing.append(key)
+            else:
+                values[key] = value
+        if not missing:
+            return values
+
+        generation = self._generation
+        raws, *ttls = await asyncio.gather(
+            self.batcher.execute("MGET", *missing),
+            *(self.batcher.execute("PTTL", key) for key in missing),
+        )
+        for key, raw, ttl_ms in zip(missing, raws, ttls):
+            if raw is None:
+                continue
+            values[key] = self.codec.decode(raw)
+            if generation == self._generation:
+                self.local.set(
+                    key, values[key], ttl=self._local_ttl(ttl_ms), size=len(raw)
+                )
+        return values
+
+    async def set(
+        self, key: str, value: typing.Any, ttl: typing.Optional[int] = None
+    ) -> None:
+        await self.mset({key: value}, ttl=ttl)
+
+    async def mset(
+        self, mapping: typing.Mapping[str, typing.Any], ttl: typing.Optional[int] = None
+    ) -> None:
+        raws = {key: self.codec.encode(value) for key, value in mapping.items()}
+        if not raws:
+            return
+
+        expire = ("EX", ttl) if ttl else ()
+        await asyncio.gather(
+            *(
+                self.batcher.execute("SET", key, raw, *expire)
+                for key, raw in raws.items()
+            ),
+            self.publish_invalidation(raws),
+        )
+        self.invalidate_local(raws)
+        local_ttl = self._local_ttl(ttl * 1000 if ttl else None)
+        for key, raw in raws.items():
+            self.local.set(key, mapping[key], ttl=local_ttl, size=len(raw))
+
+    async def delete(self, *keys: str) -> int:
+        if not keys:
+            return 0
+        deleted, _ = await asyncio.gather(
+            self.batcher.execute("DEL", *keys), self.publish_invalidation(keys)
+        )
+        self.invalidate_local(keys)
+        return deleted
+
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: typing.Callable[[], typing.Awaitable[typing.Any]],
+        ttl: int,
+        beta: float = 1.0,
+        lock_ttl: float = 10.0,
+        poll_interval: float = 0.05,
+    ) -> typing.Any:
+        """Return the value cached at `key`, computing it with `compute` on a miss.
+
+        Concurrent misses in this worker share one `compute` call, and a short
+        Redis lock lets one worker recompute the key while the others wait for
+        its result. Hot keys are refreshed before they expire, with a
+        probability that grows as the expiry nears, scaled by how long
+        `compute` took and by `beta` (XFetch). Values are stored in an envelope
+        with that metadata, only read them back with `get_or_compute`.
+        """
+        envelope = await self.get(key)
+        if envelope is not None and not self._should_refresh(envelope, beta):
+            return envelope["value"]
+
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(
+                self._compute(key, compute, ttl, lock_ttl, poll_interval, envelope)
+            )
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # A cancelled caller must not cancel the call the others wait for
+        return await asyncio.shield(future)
+
+    @staticmethod
+    def _should_refresh(envelope: typing.Dict, beta: float) -> bool:
+        # 1 - random() is in (0, 1], log() of it is <= 0
+        early = -envelope["delta"] * beta * math.log(1.0 - random.random())
+        return time.time() + early >= envelope["expiry"]
+
+    async def _compute(
+        self,
+        key: str,
+        compute: typing.Callable[[], typing.Awaitable[typing.Any]],
+        ttl: int,
+        lock_ttl: float,
+        poll_interval: float,
+        stale: typing.Optional[typing.Dict],
+    ) -> typing.Any:
+        lock_key = f"lock:{key}"
+        token = secrets.token_hex(8)
+        locked = await self.client.set(
+            lock_key, token, nx=True, px=int(lock_ttl * 1000)
+        )
+        if not locked:
+            # Another worker is recomputing, serve the stale value meanwhile
+            if stale is not None:
+                return stale["value"]
+            envelope = await self._wait_for(key, lock_key, lock_ttl, poll_interval)
+            if envelope is not None:
+                return envelope["value"]
+
+        try:
+            if locked:
+                # The previous holder may have stored the value and released
+                # the lock after this worker read the key
+                raw = await self.batcher.execute("GET", key)
+                if raw is not None:
+                    envelope = self.codec.decode(raw)
+                    if stale is None or envelope["expiry"] > stale["expiry"]:
+                        return envelope["value"]
+
+            start = time.monotonic()
+            value = await compute()
+            envelope = {
+                "value": value,
+                "delta": time.monotonic() - start,
+                "expiry": time.time() + ttl,
+            }
+            await self.set(key, envelope, ttl=ttl)
+            return value
+        finally:
+            if locked:
+                await self._release_lock(keys=[lock_key], args=[token])
+
+    async def _wait_for(
+        self, key: str, lock_key: str, timeout: float, poll_interval: float
+    ) -> typing.Optional[typing.Dict]:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(poll_interval)
+            envelope = await self.get(key)
+            if envelope is not None:
+                return envelope
+            # The lock holder failed without storing a value
+            if not await self.client.exists(lock_key):
+                break
+        return None
+
+    def invalidate_local(self, keys: typing.Optional[typing.Iterable[str]] = None):
+        self._generation += 1
+        if keys is None:
+            self.local.clear()
+            return
+        for key in keys:
+            self.local.delete(key)
+
+    def publish_invalidation(
+        self, keys: typing.Optional[typing.Iterable[str]] = None
+    ) -> asyncio.Future:
+        message = {"node": self.node_id, "keys": None if keys is None else list(keys)}
+        return self.batcher.execute("PUBLISH", self.channel, json.dumps(message))
+
+    def handle_invalidation(self, data: typing.Union[str, bytes]) -> None:
+        try:
+            message = json.loads(data)
+        except ValueError:
+            logger.warning("[Cache]::Invalid invalidation message: {!r}", data)
+            return
+        if message.get("node") != self.node_id:
+            self.invalidate_local(message.get("keys"))
+
+    async def close(self) -> None:
+        await self.batcher.close()
+
+
+# KEYS: entry, tag sets. ARGV: ttl, etag, media type, body
+_STORE_RESPONSE = """
+redis.call(
+    "HSET", KEYS[1],
+    "etag", ARGV[2], "media_type", ARGV[3], "body", ARGV[4], "headers", ARGV[5]
+)
+redis.call("EXPIRE", KEYS[1], ARGV[1])
+for i = 2, #KEYS do
+    redis.call("SADD", KEYS[i], KEYS[1])
+    if redis.call("TTL", KEYS[i]) < tonumber(ARGV[1]) then
+        redis.call("EXPIRE", KEYS[i], ARGV[1])
+    end
+end
+"""
+
+# KEYS: tag sets. Deletes the tagged entries and the sets themselves
+_PURGE_TAGS = """
+local deleted = 0
+for _, tag in ipairs(KEYS) do
+    local keys = redis.call("SMEMBERS", tag)
+    for i = 1, #keys, 1000 do
+        deleted = deleted + redis.call("DEL", unpack(keys, i, math.min(i + 999, #keys)))
+    end
+    redis.call("DEL", tag)
+end
+return deleted
+"""
+
+
+class ResponseCache:
+    """Serialized HTTP responses stored in Redis hashes, see `http_cache`.
+
+    Entries can be tagged when stored, `invalidate_tags` deletes every entry
+    carrying one of the given tags. A tag set lives as long as its longest
+    lived entry.
+    """
+
+    def __init__(self, client: aioredis.Redis, prefix: str = "http-cache"):
+        self.client = client
+        self.prefix = prefix
+        self._store = client.register_script(_STORE_RESPONSE)
+        self._purge = client.register_script(_PURGE_TAGS)
+
+    def make_key(self, *parts: typing.Any) -> str:
+        digest = hashlib.sha256(json.dumps(parts, default=str).encode()).hexdigest()
+        return f"{self.prefix}:{digest}"
+
+    def tag_key(self, tag: str) -> str:
+        return f"{self.prefix}:tag:{tag}"
+
+    async def get_etag(self, key: str) -> typing.Optional[str]:
+        etag = await self.client.hget(key, "etag")
+        return etag.decode() if etag is not None else None
+
+    async def get(self, key: str) -> typing.Optional[typing.Dict[str, typing.Any]]:
+        entry = await self.client.hgetall(key)
+        if not entry:
+            return None
+        return {
+            "etag": entry[b"etag"].decode(),
+            "media_type": entry[b"media_type"].decode(),
+            "body": entry[b"body"],
+            "headers": json.loads(entry.get(b"headers", b"[]")),
+        }
+
+    async def set(
+        self,
+        key: str,
+        body: bytes,
+        etag: str,
+        media_type: str,
+        ttl: int,
+        tags: typing.Iterable[str] = (),
+        headers: typing.Sequence[typing.Tuple[str, str]] = (),
+    ) -> None:
+        await self._store(
+            keys=[key, *map(self.tag_key, tags)],
+            args=[ttl, etag, media_type, body, json.dumps(headers)],
+        )
+
+    async def invalidate_tags(self, *tags: str) -> int:
+        if not tags:
+            return 0
+        return await self._purge(keys=[self.tag_key(tag) for tag in tags])
+
+
+class CacheInvalidationListener(resources.AsyncResource):
+    """Subscribe to the invalidation channel of a `CacheService`."""
+
+    async def init(self, cache_service: CacheService) -> asyncio.Task:
+        return asyncio.create_task(self.listen(cache_service))
+
+    async def shutdown(self, task: asyncio.Task) -> None:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+
+    @staticmethod
+    async def listen(cache_service: CacheService, retry_delay: float = 1.0) -> None:
+        while True:
+            pubsub = cache_service.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(cache_service.channel)
+                # Messages may have been missed while (re)connecting
+                cache_service.invalidate_local()
+                # Poll instead of `listen`, which blocks on the socket and
+                # would hit `socket_timeout` whenever the channel is quiet
+                while True:
+                    message = await pubsub.get_message(
+                        ignore_subscribe_messages=True, timeout=1.0
+                    )
+                    if message is not None:
+                        cache_service.handle_invalidation(message["data"])
+            except (ConnectionError, OSError) as exc:
+                logger.warning("[Cache]::Invalidation listener disconnected: {}", exc)
+            finally:
+                await pubsub.close()
+            await asyncio.sleep(retry_delay)
+
+
+class _LoopWatchdog(threading.Thread):
+    def __init__(self, loop_thread: int, threshold: float, interval: float):
+        super().__init__(name="loop-watchdog", daemon=True)
+        self.loop_thread = loop_thread
+        self.threshold = threshold
+        self.interval = interval
+        # Set by the monitor task before every sleep
+        self.deadline = time.monotonic() + interval
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        reported = None
+        while not self._stopped.wait(self.interval):
+            deadline = self.deadline
+            stalled = time.monotonic() - deadline
+            if stalled <= self.threshold or deadline == reported:
+                continue
+            # Once per stall, with the stack of what is blocking right now
+            reported = deadline
+            frame = sys._current_frames().get(self.loop_thread)
+            if frame is None:
+                continue
+            metrics.EVENT_LOOP_BLOCKED.labels().inc()
+            logger.warning(
+                "[LoopMonitor]::Event loop blocked for {:.0f} ms\n{}",
+                stalled * 1000,
+                "".join(traceback.format_stack(frame)),
+            )
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+
+class LoopMonitor(resources.AsyncResource):
+    """Measure the event loop lag and log the stack of blocking code.
+
+    A task sleeps `interval_ms` in a loop and records how late it wakes up in
+    `metrics.EVENT_LOOP_LAG`. A watchdog thread logs the stack of the loop
+    thread when the task is more than `threshold_ms` late, i.e. while a
+    callback is still blocking the loop.
+    """
+
+    async def init(
+        self, interval_ms: int = 100, threshold_ms: int = 200, enabled: bool = True
+    ) -> typing.Optional[asyncio.Task]:
+        if not enabled:
+            return None
+        return asyncio.create_task(
+            self.monitor(interval_ms / 1000, threshold_ms / 1000)
+        )
+
+    async def shutdown(self, task: typing.Optional[asyncio.Task]) -> None:
+        if task is None:
+            return
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+
+    @staticmethod
+    async def monitor(interval: float, threshold: float) -> None:
+        watchdog = _LoopWatchdog(
+            threading.get_ident(), threshold, min(interval, threshold / 2)
+        )
+        watchdog.start()
+        lag = metrics.EVENT_LOOP_LAG.labels()
+        try:
+            while True:
+                watchdog.deadline = deadline = time.monotonic() + interval
+                await asyncio.sleep(interval)
+                lag.observe(max(time.monotonic() - deadline, 0.0))
+        finally:
+            # Also when the loop is closed under the task, e.g. async_to_sync
+            watchdog.stop()
 
 
 ### HTTP Agent Example ###
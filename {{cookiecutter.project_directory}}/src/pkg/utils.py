@@ -1,6 +1,127 @@
+import time
+import typing
+from collections import OrderedDict
 from datetime import datetime
+from pydantic import TypeAdapter
+
+KT = typing.TypeVar("KT")
+VT = typing.TypeVar("VT")
+
+_MISSING = object()
 
 
 # create utc now time
 def utc_now_time() -> datetime:
     return datetime.utcnow()
+
+
+# TypeAdapters for lists of one model class, keyed by the class
+_list_adapters: typing.Dict[type, TypeAdapter] = {}
+
+
+def list_adapter(model: type) -> TypeAdapter:
+    adapter = _list_adapters.get(model)
+    if adapter is None:
+        adapter = TypeAdapter(typing.List[model])  # type: ignore[valid-type]
+        _list_adapters[model] = adapter
+    return adapter
+
+
+class LRUCache(typing.Generic[KT, VT]):
+    """Bounded in-process LRU cache with a per-entry TTL and hit/miss counters.
+
+    Entries are evicted once there are more than `maxsize` of them or, when
+    `max_bytes` is set, once the sum of their sizes (as given to `set`)
+    exceeds it. Not thread-safe; it is meant to be used from the event loop only.
+    """
+
+    __slots__ = ("_maxsize", "_max_bytes", "_ttl", "_data", "_bytes", "hits", "misses")
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        ttl: typing.Optional[float] = None,
+        max_bytes: typing.Optional[int] = None,
+    ):
+        self._maxsize = maxsize
+        self._max_bytes = max_bytes
+        self._ttl = ttl
+        self._data: "OrderedDict[KT, typing.Tuple[typing.Optional[float], VT, int]]" = (
+            OrderedDict()
+        )
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def maxsize(self) -> int:
+        return self._maxsize
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: KT) -> bool:
+        return self.get(key, _MISSING, count=False) is not _MISSING
+
+    def get(
+        self, key: KT, default: typing.Any = None, *, count: bool = True
+    ) -> typing.Optional[VT]:
+        entry = self._data.get(key)
+        if entry is not None:
+            expires_at, value, _ = entry
+            if expires_at is None or expires_at > time.monotonic():
+                self._data.move_to_end(key)
+                if count:
+                    self.hits += 1
+                return value
+            self.delete(key)
+
+        if count:
+            self.misses += 1
+        return default
+
+    def set(
+        self, key: KT, value: VT, ttl: typing.Optional[float] = None, size: int = 0
+    ) -> None:
+        ttl = self._ttl if ttl is None else ttl
+        if (
+            self._maxsize <= 0
+            or (ttl is not None and ttl <= 0)
+            or (self._max_bytes is not None and size > self._max_bytes)
+        ):
+            self.delete(key)
+            return
+
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        self.delete(key)
+        self._data[key] = (expires_at, value, size)
+        self._bytes += size
+        while len(self._data) > self._maxsize or (
+            self._max_bytes is not None and self._bytes > self._max_bytes
+        ):
+            _, (_, _, evicted) = self._data.popitem(last=False)
+            self._bytes -= evicted
+
+    def delete(self, key: KT) -> bool:
+        entry = self._data.pop(key, None)
+        if entry is None:
+            return False
+        self._bytes -= entry[2]
+        return True
+
+    def clear(self) -> None:
+        self._data.clear()
+        self._bytes = 0
+
+    def stats(self) -> typing.Dict[str, int]:
+        return {
+            "size": len(self._data),
+            "maxsize": self._maxsize,
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
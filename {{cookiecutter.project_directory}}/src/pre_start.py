@@ -29,7 +29,7 @@ wait_seconds = 1
 async def db_connected(db_service: services.DBService):
     try:
         result = await db_service.ping()
-        logger.info(f"[Database]::Ping -> {result}")
+        logger.info("[Database]::Ping -> {}", result)
 
     except ConnectionRefusedError as e:
         error_message = traceback.format_exc()
@@ -46,7 +46,7 @@ async def db_connected(db_service: services.DBService):
 async def redis_connected(cache_service: services.CacheService):
     try:
         result = await cache_service.ping()
-        logger.info(f"[Cache]::Ping -> {result}")
+        logger.info("[Cache]::Ping -> {}", result)
         if not result:
             raise ConnectionRefusedError("Redis connection refused")
     except ConnectionError as e:
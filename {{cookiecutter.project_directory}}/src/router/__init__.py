@@ -1 +1,2 @@
 from .health import router as health_router  # noqa
+from .metrics import router as metrics_router  # noqa
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, HTTPException, status, Depends
 
-from src.pkg import services, dependencies
+from src.pkg import services, dependencies, responses
 
 router = APIRouter()
 
@@ -10,6 +10,22 @@ async def health_check():
     return {"detail": "ok"}
 
 
+@router.get("/health/ready")
+async def readiness_check(
+    readiness_service: services.ReadinessService = Depends(
+        dependencies.depend_readiness_service
+    ),
+):
+    # Cached and refreshed in the background, see `ReadinessService`
+    result = await readiness_service.check()
+    return responses.ORJSONResponse(
+        result,
+        status_code=status.HTTP_200_OK
+        if result["ready"]
+        else status.HTTP_503_SERVICE_UNAVAILABLE,
+    )
+
+
 @router.get("/db/health")
 async def db_health_check(
     db_service: services.DBService = Depends(dependencies.depend_db_service),
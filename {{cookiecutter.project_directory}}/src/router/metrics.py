@@ -0,0 +1,17 @@
+from fastapi import APIRouter, Depends, Request, Response
+
+from src.config import settings, CeleryConfiguration
+from src.pkg import dependencies, metrics
+
+router = APIRouter()
+
+
+@router.get("/metrics", dependencies=[Depends(dependencies.depend_admin)])
+async def get_metrics(request: Request):
+    metrics.collect_db_pools()
+    await metrics.collect_celery_queues(
+        request.app.celery_app,
+        [queue.name for queue in CeleryConfiguration.task_queues],
+        timeout=settings.metrics_celery_timeout_sec,
+    )
+    return Response(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
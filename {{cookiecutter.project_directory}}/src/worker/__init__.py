@@ -2,15 +2,13 @@ import typing
 
 import celery
 from celery import current_app as current_celery_app
-from celery.signals import worker_process_init
+from celery.signals import task_postrun, worker_process_init
 from asgiref.sync import async_to_sync
 
 from src.config import settings
 from src.worker import (  # noqa: F401 (Tasks are imported for celery to discover them)
     tasks,
 )
-from src.pkg.containers import Application
-from src.pkg import middleware
 
 
 def create_celery(config) -> celery:
@@ -23,6 +21,10 @@ def create_celery(config) -> celery:
 # Inititalize
 @worker_process_init.connect
 def worker_initialize(*args: typing.Any, **kwargs: typing.Any) -> None:
+    # Imported in the worker processes only, not by the web app
+    from src.pkg import middleware
+    from src.pkg.containers import Application
+
     if settings.sentry_dsn:
         middleware.init_sentry(
             dsn=settings.sentry_dsn,
@@ -34,6 +36,19 @@ def worker_initialize(*args: typing.Any, **kwargs: typing.Any) -> None:
             enable_tracing=settings.sentry_enable_tracing,
         )
 
+    config = settings.model_dump(mode="json")
+    # No invalidation listener runs here, a local cache tier would go stale
+    config["cache_local_size"] = 0
     container = Application()
-    container.config.from_dict(settings.model_dump(mode="json"))
+    container.config.from_dict(config)
+    # The worker does not build the FastAPI app, which wires the tasks there
+    container.wire(modules=[tasks])
     async_to_sync(container.service.init_resources)()
+
+
+@task_postrun.connect
+def release_primary_pin(*args: typing.Any, **kwargs: typing.Any) -> None:
+    # Tasks of a worker share one context, a write must not pin the next ones
+    from src.pkg import repositories
+
+    repositories.unpin_primary()
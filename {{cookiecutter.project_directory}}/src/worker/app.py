@@ -0,0 +1,8 @@
+"""Celery entry module: `celery -A src.worker.app worker`.
+
+Only the Celery app and the tasks are loaded, the FastAPI app is not built.
+"""
+from src.config import CeleryConfiguration
+from src.worker import create_celery
+
+celery = create_celery(config=CeleryConfiguration)
@@ -20,7 +20,7 @@ def ebapi_save_live_track(
     ebapi_handler: EBAPIHandler = Provide[Application.service.ebapi_handler],
 ) -> EBSchema.SaveAndCloseRoomResponse:
     response = ebapi_handler.save_live_track(user_id=user_id, body=payload)
-    logger.info(f"EB API save live track response: {response}")
+    logger.info("EB API save live track response: {}", response)
     return response
 
 """
@@ -17,6 +17,7 @@ async def initialize_tests(event_loop):
     from src.config import settings
 
     TORTOISE_TEST_ORM = get_tortoise_config(settings.pg_dsn)
+    TORTOISE_TEST_ORM["apps"]["models"]["models"].append("tests.models")
     await Tortoise.init(config=TORTOISE_TEST_ORM)
     await Tortoise.generate_schemas()
     await generate_schema_for_client(Tortoise.get_connection("default"), safe=True)
@@ -0,0 +1,15 @@
+from tortoise import fields, models
+
+
+# Model used to exercise the generic repositories
+class Item(models.Model):
+    id = fields.IntField(pk=True)
+    name = fields.CharField(max_length=255)
+    sku = fields.CharField(max_length=64, unique=True, null=True)
+    price = fields.IntField(default=0)
+    version = fields.IntField(default=0)
+    created_at = fields.DatetimeField(auto_now_add=True)
+    updated_at = fields.DatetimeField(auto_now=True)
+
+    class Meta:
+        table = "test_items"
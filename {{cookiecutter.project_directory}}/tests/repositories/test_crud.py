@@ -0,0 +1,335 @@
+import asyncio
+import contextlib
+from unittest import mock
+import pytest
+from pydantic import BaseModel, Field
+from tortoise import connections
+from tortoise.expressions import F
+from tortoise.transactions import in_transaction
+
+from src.pkg import repositories
+from tests.models import Item
+
+
+@pytest.fixture()
+def crud():
+    return repositories.CRUDBase(Item)
+
+
+async def create_items(crud: repositories.CRUDBase, count: int, **kwargs):
+    await Item.all().delete()
+    for i in range(count):
+        await crud._create(**{"name": f"item-{i}", "price": i, **kwargs})
+
+
+@pytest.mark.asyncio
+async def test_filter_keyset(crud: repositories.CRUDBase):
+    await create_items(crud, 25)
+    await Item.all().update(price=F("id") % 5)
+
+    pages, cursor = [], None
+    while True:
+        items, cursor = await crud.filter_keyset(cursor=cursor, order_by="price")
+        pages.append(items)
+        if cursor is None:
+            break
+
+    assert [len(page) for page in pages] == [10, 10, 5]
+    ordered = [(item.price, item.id) for page in pages for item in page]
+    assert ordered == sorted(ordered)
+    assert len({item_id for _, item_id in ordered}) == 25
+
+
+@pytest.mark.asyncio
+async def test_filter_keyset_descending_with_filter(crud: repositories.CRUDBase):
+    await create_items(crud, 12)
+
+    items, cursor = await crud.filter_keyset(order_by="-id", limit=3, price__gte=6)
+    assert [item.price for item in items] == [11, 10, 9]
+
+    items, cursor = await crud.filter_keyset(
+        cursor=cursor, order_by="-id", limit=3, price__gte=6
+    )
+    assert [item.price for item in items] == [8, 7, 6]
+    assert cursor is None
+
+
+@pytest.mark.asyncio
+async def test_filter_keyset_invalid_cursor(crud: repositories.CRUDBase):
+    with pytest.raises(repositories.InvalidCursor):
+        await crud.filter_keyset(cursor="not-a-cursor")
+
+    with pytest.raises(repositories.InvalidCursor):
+        await crud.filter_keyset(cursor=repositories.encode_cursor("x", "y"))
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("copy_threshold", [None, 1])
+async def test_bulk_create(crud: repositories.CRUDBase, copy_threshold):
+    await Item.all().delete()
+    rows = [{"name": f"item-{i}", "price": i} for i in range(50)]
+
+    count = await crud.bulk_create(rows, batch_size=7, copy_threshold=copy_threshold)
+    assert count == 50
+    assert await Item.all().count() == 50
+    item = await Item.get(name="item-42")
+    assert item.price == 42
+    assert item.created_at is not None
+
+    pks = await crud.bulk_create(rows[:3], returning=True)
+    assert isinstance(pks, list)
+    assert sorted(pks) == sorted(
+        await Item.filter(id__in=pks).values_list("id", flat=True)
+    )
+    assert await crud.bulk_create([]) == 0
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("copy_threshold", [None, 1])
+async def test_bulk_upsert(crud: repositories.CRUDBase, copy_threshold):
+    await Item.all().delete()
+    await crud.bulk_create([{"name": "old", "sku": "a", "price": 1}])
+
+    rows = [
+        {"name": "new", "sku": "a", "price": 2},
+        {"name": "other", "sku": "b", "price": 3},
+    ]
+    count = await crud.bulk_upsert(
+        rows,
+        conflict_fields=["sku"],
+        update_fields=["price"],
+        copy_threshold=copy_threshold,
+    )
+    assert count == 2
+    assert await Item.all().count() == 2
+
+    item = await Item.get(sku="a")
+    assert (item.name, item.price) == ("old", 2)
+
+    # Conflicting rows are skipped when ignoring conflicts
+    count = await crud.bulk_create(
+        rows, ignore_conflicts=True, copy_threshold=copy_threshold
+    )
+    assert count == 0
+
+
+@pytest.mark.asyncio
+async def test_bulk_upsert_default_update_fields(crud: repositories.CRUDBase):
+    await Item.all().delete()
+    await crud.bulk_create([{"name": "old", "sku": "a", "price": 5, "version": 3}])
+    before = await Item.get(sku="a")
+
+    count = await crud.bulk_upsert(
+        [{"name": "new", "sku": "a"}, {"name": "other", "sku": "b"}],
+        conflict_fields=["sku"],
+    )
+    assert count == 2
+
+    # Only the fields in the payload are updated
+    item = await Item.get(sku="a")
+    assert item.name == "new"
+    assert (item.id, item.price, item.version) == (before.id, 5, 3)
+    assert item.created_at == before.created_at
+
+
+@pytest.mark.asyncio
+async def test_bulk_upsert_on_pk(crud: repositories.CRUDBase):
+    await Item.all().delete()
+    pks = await crud.bulk_create([{"name": "old", "price": 1}], returning=True)
+    assert isinstance(pks, list)
+
+    # A negative id stays clear of the sequence
+    count = await crud.bulk_upsert(
+        [{"id": pks[0], "name": "new", "price": 2}, {"id": -1, "name": "other"}],
+        conflict_fields=["id"],
+    )
+    assert count == 2
+    assert await Item.all().order_by("id").values_list("id", "name", "price") == [
+        (-1, "other", 0),
+        (pks[0], "new", 2),
+    ]
+
+    with pytest.raises(ValueError):
+        await crud.bulk_upsert([{"name": "new"}], conflict_fields=["id"])
+    with pytest.raises(ValueError):
+        await crud.bulk_upsert(
+            [{"id": pks[0], "name": "new"}, {"name": "other"}],
+            conflict_fields=["id"],
+        )
+
+
+@pytest.mark.asyncio
+async def test_bulk_update(crud: repositories.CRUDBase):
+    await create_items(crud, 5)
+    items = await Item.all().order_by("id")
+
+    updates = {item.id: {"price": item.price * 10} for item in items[:3]}
+    updates[items[3].id] = {"name": "renamed", "sku": None}
+    updates[-1] = {"price": 1}
+    count = await crud.bulk_update(updates, batch_size=2)
+    assert count == 4
+
+    items = await Item.all().order_by("id")
+    assert [item.price for item in items] == [0, 10, 20, 3, 4]
+    assert items[3].name == "renamed"
+    assert items[4].name == "item-4"
+
+
+@pytest.mark.asyncio
+async def test_bulk_update_optimistic(crud: repositories.CRUDBase):
+    await create_items(crud, 2)
+    first, second = await Item.all().order_by("id")
+    await Item.filter(id=second.id).update(version=1)
+
+    updated_pks = await crud.bulk_update(
+        {
+            first.id: {"price": 100, "version": 0},
+            # Stale version, left untouched
+            second.id: {"price": 200, "version": 0},
+        },
+        version_field="version",
+        returning=True,
+    )
+    assert updated_pks == [first.id]
+
+    updated_first, updated_second = await Item.all().order_by("id")
+    assert (updated_first.price, updated_first.version) == (100, 1)
+    assert (updated_second.price, updated_second.version) == (1, 1)
+    # auto_now fields are set on the updated rows only
+    assert updated_first.updated_at > first.updated_at
+    assert updated_second.updated_at == second.updated_at
+
+    with pytest.raises(ValueError):
+        await crud.bulk_update({first.id: {"price": 1}}, version_field="version")
+
+
+@pytest.mark.asyncio
+async def test_iter_batches(crud: repositories.CRUDBase):
+    await create_items(crud, 25)
+
+    batches = [
+        batch
+        async for batch in crud.iter_batches(batch_size=10, order_by="id", price__lt=23)
+    ]
+    assert [len(batch) for batch in batches] == [10, 10, 3]
+    assert all(isinstance(item, Item) for batch in batches for item in batch)
+
+    prices = [item.price async for item in crud.stream(batch_size=4, order_by="-id")]
+    assert prices == list(reversed(range(25)))
+
+    # Closing the generator early hands the cursor's connection back
+    pool = Item._meta.db._pool
+    in_use = pool.get_size() - pool.get_idle_size()
+    async with contextlib.aclosing(crud.stream(batch_size=4)) as items:
+        async for _ in items:
+            assert pool.get_size() - pool.get_idle_size() == in_use + 1
+            break
+    assert pool.get_size() - pool.get_idle_size() == in_use
+
+
+class ItemOut(BaseModel):
+    id: int
+    title: str = Field(alias="name")
+    price: int
+
+
+@pytest.mark.asyncio
+async def test_filter_projection(crud: repositories.CRUDBase):
+    await create_items(crud, 5)
+
+    rows = await crud.filter_values("name", "price", order_by="id", price__gte=3)
+    assert rows == [{"name": "item-3", "price": 3}, {"name": "item-4", "price": 4}]
+
+    rows = await crud.filter_values_list("name", "price", order_by="-id", limit=2)
+    assert rows == [("item-4", 4), ("item-3", 3)]
+
+    names = await crud.filter_values_list("name", flat=True, order_by="id", offset=3)
+    assert names == ["item-3", "item-4"]
+
+    items = await crud.filter_schema(ItemOut, order_by="id", limit=2)
+    assert [(item.title, item.price) for item in items] == [
+        ("item-0", 0),
+        ("item-1", 1),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_read_replica_routing(crud: repositories.CRUDBase):
+    # Route reads to "default" as if it was a replica
+    repositories.set_read_replicas(["default"])
+    try:
+
+        async def handle_request(write: bool):
+            assert repositories.get_read_connection() is connections.get("default")
+            if write:
+                await crud._create(name="item")
+            await crud.filter_many()
+            return repositories.get_read_connection()
+
+        # A write pins the rest of its own request to the primary only
+        assert await asyncio.create_task(handle_request(write=True)) is None
+        assert await asyncio.create_task(handle_request(write=False)) is not None
+
+        async with in_transaction():
+            assert repositories.get_read_connection() is None
+
+        # Contexts shared by several units of work, e.g. Celery tasks
+        with repositories.primary_scope():
+            await crud._create(name="item")
+            assert repositories.get_read_connection() is None
+        assert repositories.get_read_connection() is not None
+
+        token = repositories.pin_primary()
+        assert repositories.get_read_connection() is None
+        repositories.unpin_primary(token)
+        assert repositories.get_read_connection() is not None
+    finally:
+        repositories.set_read_replicas([])
+
+    assert repositories.get_read_connection() is None
+
+
+@pytest.mark.asyncio
+async def test_data_loader(crud: repositories.CRUDBase):
+    await create_items(crud, 5)
+    pks = await Item.all().order_by("id").values_list("id", flat=True)
+
+    loader = repositories.DataLoaderRegistry().get(Item)
+    with mock.patch.object(
+        repositories.CRUDBase,
+        "filter_by_pks",
+        autospec=True,
+        side_effect=repositories.CRUDBase.filter_by_pks,
+    ) as filter_by_pks:
+        first, second, missing, again = await asyncio.gather(
+            loader.load(pks[0]),
+            loader.load(pks[1]),
+            loader.load(-1),
+            loader.load(pks[0]),
+        )
+        assert (first.price, second.price, missing) == (0, 1, None)
+        assert again is first
+        assert filter_by_pks.call_count == 1
+        assert sorted(filter_by_pks.call_args.args[1]) == sorted([pks[0], pks[1], -1])
+
+        # Memoized for the rest of the request, keys are normalized
+        assert await loader.load(str(pks[1])) is second
+        items = await loader.load_many(pks[1:])
+        assert [item.price for item in items] == [1, 2, 3, 4]
+        assert filter_by_pks.call_count == 2
+
+        loader.clear(pks[1])
+        await loader.load(pks[1])
+        assert filter_by_pks.call_count == 3
+
+
+@pytest.mark.asyncio
+async def test_data_loader_registry_is_request_scoped(app):
+    async def handle_request():
+        registry = app.container.service.data_loaders()
+        assert app.container.service.data_loaders() is registry
+        return registry
+
+    first = await asyncio.create_task(handle_request())
+    second = await asyncio.create_task(handle_request())
+    assert first is not second
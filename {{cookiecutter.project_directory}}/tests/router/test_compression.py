@@ -0,0 +1,99 @@
+import gzip
+import pytest
+from fastapi import FastAPI, Response
+from fastapi.responses import StreamingResponse
+from httpx import AsyncClient
+
+from src.pkg import middleware
+
+BODY = b'{"items": "' + b"x" * 4096 + b'"}'
+
+
+def create_app(**kwargs) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/large")
+    async def large():
+        return Response(BODY, media_type="application/json", headers={"ETag": '"a"'})
+
+    @app.get("/small")
+    async def small():
+        return {"detail": "ok"}
+
+    @app.get("/image")
+    async def image():
+        return Response(BODY, media_type="image/png")
+
+    @app.get("/stream")
+    async def stream():
+        async def chunks():
+            for _ in range(4):
+                yield b"y" * 1024
+
+        return StreamingResponse(chunks(), media_type="text/plain")
+
+    app.add_middleware(middleware.CompressionMiddleware, **kwargs)
+    return app
+
+
+async def get(app: FastAPI, path: str, encoding: str = "gzip"):
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        return await client.get(path, headers={"Accept-Encoding": encoding})
+
+
+@pytest.mark.asyncio
+async def test_compression():
+    app = create_app()
+
+    response = await get(app, "/large")
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert response.headers["ETag"] == 'W/"a"'
+    assert int(response.headers["Content-Length"]) < len(BODY)
+    assert response.content == BODY
+
+    response = await get(app, "/stream")
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.content == b"y" * 4096
+
+    for path in ("/small", "/image"):
+        assert "Content-Encoding" not in (await get(app, path)).headers
+    assert "Content-Encoding" not in (await get(app, "/large", "identity")).headers
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("encoding", ["br", "zstd"])
+async def test_compression_optional_encodings(encoding):
+    pytest.importorskip({"br": "brotli", "zstd": "zstandard"}[encoding])
+    response = await get(create_app(), "/large", f"gzip;q=0.5, {encoding}")
+    assert response.headers["Content-Encoding"] == encoding
+
+
+@pytest.mark.asyncio
+async def test_compression_cache_paths():
+    compression = middleware.CompressionMiddleware(None, cache_paths=["/openapi.json"])
+    first = await compression.compress("gzip", "/openapi.json", BODY)
+    # Compressed once, and again only when the body changes
+    assert await compression.compress("gzip", "/openapi.json", BODY) is first
+    changed = await compression.compress("gzip", "/openapi.json", BODY + b" ")
+    assert gzip.decompress(changed) == BODY + b" "
+    assert await compression.compress("gzip", "/other", BODY) is not first
+
+
+@pytest.mark.asyncio
+async def test_compression_negotiate():
+    compression = middleware.CompressionMiddleware(None)
+    assert compression.negotiate("gzip, deflate") == "gzip"
+    assert compression.negotiate("gzip;q=0, *;q=0.1") != "gzip"
+    assert compression.negotiate("deflate") is None
+    assert gzip.decompress(await compression.compress("gzip", "/", BODY)) == BODY
+
+
+@pytest.mark.asyncio
+async def test_compression_threadpool():
+    # Every body and chunk goes through the threadpool
+    app = create_app(threadpool_min_size=1)
+    for path in ("/large", "/stream"):
+        response = await get(app, path)
+        assert response.headers["Content-Encoding"] == "gzip"
+    assert response.content == b"y" * 4096
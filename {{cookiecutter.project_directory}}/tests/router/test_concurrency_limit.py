@@ -0,0 +1,94 @@
+import asyncio
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient
+
+from src.pkg import metrics, middleware
+
+
+def create_limited_app(limit: middleware.AIMDLimit) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/slow")
+    @app.get("/health")
+    @app.get("/admin/slow")
+    async def slow():
+        await asyncio.sleep(0.2)
+        return {"detail": "ok"}
+
+    app.add_middleware(
+        middleware.ConcurrencyLimitMiddleware,
+        limit=limit,
+        exempt_paths=["/health"],
+        priority_prefixes=["/admin"],
+        retry_after=2,
+    )
+    return app
+
+
+@pytest.mark.asyncio
+async def test_concurrency_limit():
+    limit = middleware.AIMDLimit(
+        initial=2, min_limit=1, max_limit=10, latency_target=0.1, backoff_ratio=0.5
+    )
+    app = create_limited_app(limit)
+    rejected = metrics.CONCURRENCY_REJECTED.labels().value
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        responses = await asyncio.gather(*[client.get("/slow") for _ in range(5)])
+        assert sorted(r.status_code for r in responses) == [200, 200, 503, 503, 503]
+        shed = next(r for r in responses if r.status_code == 503)
+        assert shed.headers["Retry-After"] == "2"
+        assert shed.json() == {"detail": "Server overloaded"}
+
+        # Slow responses halved the limit, once
+        assert limit.limit == 1
+        assert limit.in_flight == 0
+        assert metrics.CONCURRENCY_LIMIT.labels().value == 1
+        assert metrics.CONCURRENCY_REJECTED.labels().value == rejected + 3
+
+        # Health and priority routes are never shed
+        responses = await asyncio.gather(
+            client.get("/slow"),
+            *[client.get("/health") for _ in range(3)],
+            *[client.get("/admin/slow") for _ in range(3)],
+        )
+        assert {r.status_code for r in responses} == {200}
+
+
+def test_aimd_limit():
+    limit = middleware.AIMDLimit(
+        initial=4, min_limit=2, max_limit=5, latency_target=10, backoff_ratio=0.5
+    )
+
+    # Idle, fast requests do not raise the limit
+    assert limit.acquire()
+    limit.release(0.01)
+    assert limit.limit == 4
+
+    # Busy, about one more per window of `limit` fast requests
+    for _ in range(4):
+        assert limit.acquire()
+    assert not limit.acquire()
+    for _ in range(4):
+        limit.release(0.01)
+        assert limit.acquire()
+    assert 4.8 < limit.limit < 5
+    for _ in range(8):
+        limit.release(0.01)
+        limit.acquire()
+    assert limit.limit == 5
+    while limit.in_flight:
+        limit.release(0.01)
+
+    # One decrease per latency target, never below the minimum
+    limit.acquire()
+    limit.release(0.01, overloaded=True)
+    assert limit.limit == 2.5
+    limit.acquire()
+    limit.release(20)
+    assert limit.limit == 2.5
+    limit._decreased_at -= 10
+    limit.acquire()
+    limit.release(20)
+    assert limit.limit == 2
@@ -60,3 +60,20 @@ async def test_cache_health_check(app: FastAPI, client: AsyncClient):
         assert r.status_code == 503, f"Error status code: {r.json()}"
 
     cache_service_mock.ping.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_readiness_check(app: FastAPI, client: AsyncClient):
+    endpoint = "/health/ready"
+    r = await client.get(endpoint)
+    assert r.status_code == 200, f"Error status code: {r.json()}"
+    assert set(r.json()["checks"]) == {"database", "cache"}
+
+    async def unavailable():
+        return False
+
+    readiness_service = services.ReadinessService({"database": unavailable})
+    with app.container.service.override_providers(readiness_service=readiness_service):
+        r = await client.get(endpoint)
+        assert r.status_code == 503, f"Error status code: {r.json()}"
+        assert r.json()["checks"]["database"]["ok"] is False
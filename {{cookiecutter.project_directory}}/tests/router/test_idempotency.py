@@ -0,0 +1,96 @@
+import uuid
+import asyncio
+import pytest
+from fastapi import FastAPI, HTTPException
+from httpx import AsyncClient
+
+from src.config import settings
+from src.pkg import db, middleware
+
+
+@pytest.fixture()
+def calls():
+    return []
+
+
+@pytest.fixture()
+def idempotent_app(calls) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/orders", status_code=201)
+    async def create_order(order: dict):
+        calls.append(order)
+        await asyncio.sleep(0.1)
+        if order.get("fail"):
+            raise HTTPException(status_code=503)
+        return {"id": len(calls), **order}
+
+    client = db.CacheResource().init(settings.redis_dsn)
+    app.add_middleware(
+        middleware.IdempotencyMiddleware,
+        redis=lambda: client,
+        lock_ttl=2,
+        max_body_size=1024,
+        poll_interval=0.01,
+        prefix=f"test:idempotency:{uuid.uuid4().hex}",
+    )
+    return app
+
+
+@pytest.mark.asyncio
+async def test_idempotency_replay(idempotent_app: FastAPI, calls):
+    async with AsyncClient(app=idempotent_app, base_url="http://test") as client:
+        headers = {"Idempotency-Key": "order-1"}
+        # Concurrent duplicates wait for the first response
+        first, second = await asyncio.gather(
+            client.post("/orders", json={"item": "a"}, headers=headers),
+            client.post("/orders", json={"item": "a"}, headers=headers),
+        )
+        assert len(calls) == 1
+        assert first.status_code == second.status_code == 201
+        assert first.json() == second.json() == {"id": 1, "item": "a"}
+
+        replayed = await client.post("/orders", json={"item": "a"}, headers=headers)
+        assert replayed.json() == {"id": 1, "item": "a"}
+        assert replayed.headers["Idempotent-Replayed"] == "true"
+        assert replayed.headers["content-type"] == "application/json"
+
+        response = await client.post("/orders", json={"item": "b"}, headers=headers)
+        assert response.status_code == 422
+
+        # Scoped to the caller and ignored without a key
+        await client.post(
+            "/orders",
+            json={"item": "a"},
+            headers={**headers, "Authorization": "Bearer other"},
+        )
+        await client.post("/orders", json={"item": "a"})
+        assert len(calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_idempotency_server_errors_are_not_stored(idempotent_app: FastAPI, calls):
+    async with AsyncClient(app=idempotent_app, base_url="http://test") as client:
+        headers = {"Idempotency-Key": "order-2"}
+        for _ in range(2):
+            response = await client.post(
+                "/orders", json={"fail": True}, headers=headers
+            )
+            assert response.status_code == 503
+        assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_idempotency_request_body_too_large(idempotent_app: FastAPI, calls):
+    async with AsyncClient(app=idempotent_app, base_url="http://test") as client:
+        response = await client.post(
+            "/orders",
+            json={"item": "a" * 2048},
+            headers={"Idempotency-Key": "order-3"},
+        )
+        assert response.status_code == 413
+        assert calls == []
+
+        # Without a key the body is not buffered
+        response = await client.post("/orders", json={"item": "a" * 2048})
+        assert response.status_code == 201
@@ -0,0 +1,80 @@
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient
+from tortoise import connections
+
+from src.pkg import metrics
+
+ADMIN = ("admin", "admin")
+
+
+def sample(text: str, name: str, labels: str) -> float:
+    series = name + "{" + labels + "} "
+    for line in text.splitlines():
+        if line.startswith(series):
+            return float(line.rsplit(" ", 1)[1])
+    raise AssertionError(f"{series}not exposed")
+
+
+@pytest.mark.asyncio
+async def test_metrics(app: FastAPI, client: AsyncClient):
+    r = await client.get("/metrics")
+    assert r.status_code == 401
+    r = await client.get("/metrics", auth=("admin", "wrong"))
+    assert r.status_code == 401
+
+    requests = metrics.HTTP_REQUESTS.labels("GET", "/health", "200").value
+    for _ in range(3):
+        await client.get("/health")
+    await client.get("/not-found/1")
+    await client.post("/health")
+    await client.get("/cache/health")
+
+    # Queries through an instrumented pool record their wait
+    client_db = connections.get("default")
+    metrics.instrument_db_pool(client_db)
+    await client_db.execute_query("SELECT 1")
+
+    r = await client.get("/metrics", auth=ADMIN)
+    assert r.status_code == 200
+    assert r.headers["content-type"] == metrics.CONTENT_TYPE
+    text = r.text
+
+    route = 'method="GET",route="/health"'
+    assert sample(text, "http_requests_total", route + ',status="200"') == (
+        requests + 3
+    )
+    assert sample(text, "http_request_duration_seconds_count", route) >= 3
+    assert 'route="unmatched",status="404"' in text
+    assert 'method="POST",route="/health",status="405"' in text
+    # Only the scrape itself is still in flight
+    assert sample(text, "http_requests_in_progress", route) == 0
+    assert (
+        sample(text, "http_requests_in_progress", 'method="GET",route="/metrics"') == 1
+    )
+
+    assert sample(text, "redis_command_duration_seconds_count", 'command="PING"') >= 1
+    assert sample(text, "db_pool_acquire_seconds_count", 'connection="default"') >= 1
+    assert sample(text, "db_pool_connections_max", 'connection="default"') >= 1
+    assert sample(text, "celery_queue_length", 'queue="hight"') >= 0
+    assert sample(text, "celery_queue_length", 'queue="low"') >= 0
+
+
+def test_histogram_render():
+    histogram = metrics.Histogram(
+        "test_seconds", "Test.", ("kind",), buckets=(0.1, 1.0), registry=None
+    )
+    child = histogram.labels("a")
+    for value in (0.05, 0.1, 0.5, 3.0):
+        child.observe(value)
+
+    lines = []
+    histogram.render(lines)
+    assert lines[2:] == [
+        'test_seconds_bucket{kind="a",le="0.1"} 2',
+        'test_seconds_bucket{kind="a",le="1"} 3',
+        'test_seconds_bucket{kind="a",le="+Inf"} 4',
+        'test_seconds_sum{kind="a"} 3.65',
+        'test_seconds_count{kind="a"} 4',
+    ]
+    assert histogram.labels("a") is child
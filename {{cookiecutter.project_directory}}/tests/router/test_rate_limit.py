@@ -0,0 +1,85 @@
+import uuid
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient
+
+from src.config import settings
+from src.pkg import db, middleware, schema, services
+
+
+def create_limited_app(redis_dsn=settings.redis_dsn, **kwargs) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/items")
+    @app.get("/health")
+    @app.get("/auth/login")
+    async def endpoint():
+        return {"detail": "ok"}
+
+    client = db.CacheResource().init(redis_dsn, socket_connect_timeout=0.5)
+    options = {
+        "default": middleware.RateLimit(rate=0.5, burst=3),
+        "exempt_paths": ["/health"],
+        "local_batch": 2,
+        # Unique keys, buckets from earlier runs are still in Redis
+        "prefix": f"test:ratelimit:{uuid.uuid4().hex}",
+        **kwargs,
+    }
+    app.add_middleware(
+        middleware.RateLimitMiddleware,
+        redis=lambda: client,
+        auth_service=lambda: services.AuthService(None, "admin", "admin"),
+        **options,
+    )
+    return app
+
+
+async def get_statuses(app: FastAPI, path: str, count: int, **kwargs):
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        return [(await client.get(path, **kwargs)) for _ in range(count)]
+
+
+@pytest.mark.asyncio
+async def test_rate_limit():
+    app = create_limited_app(routes={"/auth": middleware.RateLimit(rate=0.5, burst=1)})
+
+    responses = await get_statuses(app, "/items", 4)
+    assert [r.status_code for r in responses] == [200, 200, 200, 429]
+    assert int(responses[-1].headers["Retry-After"]) >= 1
+
+    # Exempt paths and routes with their own bucket
+    assert {r.status_code for r in await get_statuses(app, "/health", 5)} == {200}
+    responses = await get_statuses(app, "/auth/login", 2)
+    assert [r.status_code for r in responses] == [200, 429]
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_per_api_key():
+    app = create_limited_app(principal=schema.RateLimitPrincipal.api_key)
+
+    first = await get_statuses(app, "/items", 4, headers={"X-API-Key": "first"})
+    second = await get_statuses(app, "/items", 1, headers={"X-API-Key": "second"})
+    assert [r.status_code for r in first] == [200, 200, 200, 429]
+    assert second[0].status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_behind_trusted_proxy():
+    # The test client connects from 127.0.0.1
+    app = create_limited_app(trusted_proxies=["127.0.0.0/8", "10.0.0.1"])
+
+    first = await get_statuses(
+        app, "/items", 4, headers={"X-Forwarded-For": "203.0.113.1, 10.0.0.1"}
+    )
+    second = await get_statuses(
+        app, "/items", 1, headers={"X-Forwarded-For": "203.0.113.2"}
+    )
+    assert [r.status_code for r in first] == [200, 200, 200, 429]
+    assert second[0].status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_fails_open():
+    app = create_limited_app(redis_dsn="redis://localhost:1/0")
+    responses = await get_statuses(app, "/items", 5)
+    assert {r.status_code for r in responses} == {200}
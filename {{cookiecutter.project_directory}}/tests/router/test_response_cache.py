@@ -0,0 +1,155 @@
+import typing
+import pytest
+from fastapi import FastAPI, Response
+from fastapi.responses import FileResponse
+from httpx import AsyncClient
+from pydantic import BaseModel
+
+from src.pkg import http_cache, services
+
+
+class ItemOut(BaseModel):
+    id: int
+    name: str
+
+
+@pytest.fixture()
+def calls(app: FastAPI):
+    calls: typing.List[typing.Any] = []
+
+    @app.get("/cached/items/{item_id}", response_model=ItemOut)
+    @http_cache.cache_response(ttl=30, tags=["items", "item:{item_id}"])
+    async def get_item(item_id: int, q: str = ""):
+        calls.append(item_id)
+        return {"id": item_id, "name": f"item-{item_id}{q}", "secret": "hidden"}
+
+    @app.get("/cached/me")
+    @http_cache.cache_response(ttl=30, tags=["me"], vary_user=True)
+    def get_me():
+        calls.append("me")
+        return {"calls": len(calls)}
+
+    @app.get("/cached/headers")
+    @http_cache.cache_response(ttl=30, tags=["headers"])
+    async def get_with_headers(response: Response, cookie: bool = False):
+        calls.append("headers")
+        response.headers["X-Version"] = "1"
+        if cookie:
+            response.set_cookie("session", "secret")
+        return {"ok": True}
+
+    @app.get("/cached/file")
+    @http_cache.cache_response(ttl=30, tags=["file"])
+    async def get_file():
+        calls.append("file")
+        return FileResponse(__file__)
+
+    return calls
+
+
+@pytest.mark.asyncio
+async def test_response_cache(app: FastAPI, client: AsyncClient, calls):
+    cache: services.ResponseCache = app.container.service.response_cache()
+    await cache.invalidate_tags("items")
+
+    response = await client.get("/cached/items/1")
+    assert response.status_code == 200
+    assert response.headers["X-Cache"] == "MISS"
+    # The response model still applies
+    assert response.json() == {"id": 1, "name": "item-1"}
+    etag = response.headers["ETag"]
+
+    response = await client.get("/cached/items/1")
+    assert response.headers["X-Cache"] == "HIT"
+    assert response.json() == {"id": 1, "name": "item-1"}
+    assert response.headers["ETag"] == etag
+    assert calls == [1]
+
+    response = await client.get("/cached/items/1", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    # The query string is part of the key
+    response = await client.get("/cached/items/1", params={"q": "-x"})
+    assert response.json()["name"] == "item-1-x"
+    assert calls == [1, 1]
+
+    await client.get("/cached/items/2")
+    assert await cache.invalidate_tags("item:1") == 2
+    response = await client.get("/cached/items/1", headers={"If-None-Match": etag})
+    # Recomputed, the body did not change so the ETag still matches
+    assert response.status_code == 304
+    assert calls == [1, 1, 2, 1]
+    assert await cache.invalidate_tags("items") == 2
+
+
+@pytest.mark.asyncio
+async def test_response_cache_vary_user(app: FastAPI, client: AsyncClient, calls):
+    cache: services.ResponseCache = app.container.service.response_cache()
+    await cache.invalidate_tags("me")
+    auth_service: services.AuthService = app.container.service.auth_service()
+
+    def auth(user_id: str):
+        token = auth_service.create_jwt_token(user_id=user_id, scopes=[])
+        return {"Authorization": f"Bearer {token}"}
+
+    first = await client.get("/cached/me", headers=auth("1"))
+    assert (await client.get("/cached/me", headers=auth("1"))).json() == first.json()
+    second = await client.get("/cached/me", headers=auth("2"))
+    assert second.json() != first.json()
+    assert second.headers["Vary"] == "Authorization"
+
+    # Invalid tokens are never served from or stored in the cache
+    response = await client.get("/cached/me", headers={"Authorization": "Bearer x"})
+    assert "X-Cache" not in response.headers
+    assert calls == ["me", "me", "me"]
+
+
+@pytest.mark.asyncio
+async def test_response_cache_credentials(app: FastAPI, client: AsyncClient, calls):
+    cache: services.ResponseCache = app.container.service.response_cache()
+    await cache.invalidate_tags("items")
+
+    # Shared entries are neither served to nor stored for authenticated callers
+    await client.get("/cached/items/1")
+    for headers in ({"Authorization": "Bearer x"}, {"X-API-Key": "key"}):
+        response = await client.get("/cached/items/1", headers=headers)
+        assert "X-Cache" not in response.headers
+    assert calls == [1, 1, 1]
+
+
+@pytest.mark.asyncio
+async def test_response_cache_sub_response_headers(
+    app: FastAPI, client: AsyncClient, calls
+):
+    cache: services.ResponseCache = app.container.service.response_cache()
+    await cache.invalidate_tags("headers")
+
+    for x_cache in ("MISS", "HIT"):
+        response = await client.get("/cached/headers")
+        assert response.headers["X-Cache"] == x_cache
+        assert response.headers["X-Version"] == "1"
+    assert calls == ["headers"]
+
+    # Responses setting a cookie stay with their caller
+    for _ in range(2):
+        response = await client.get("/cached/headers", params={"cookie": True})
+        assert response.cookies["session"] == "secret"
+        assert "X-Cache" not in response.headers
+    assert calls == ["headers"] * 3
+
+
+@pytest.mark.asyncio
+async def test_response_cache_file_response(client: AsyncClient, calls):
+    # File responses have no body to store, they bypass the cache
+    for _ in range(2):
+        response = await client.get("/cached/file")
+        assert response.status_code == 200
+        assert "X-Cache" not in response.headers
+    assert calls == ["file", "file"]
+
+
+def test_etag_matches():
+    assert http_cache.etag_matches('"a", W/"b"', '"b"')
+    assert http_cache.etag_matches("*", '"c"')
+    assert not http_cache.etag_matches('"a"', '"b"')
@@ -0,0 +1,76 @@
+import typing
+import decimal
+import datetime
+import orjson
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient
+from pydantic import BaseModel, Field
+
+from src.pkg import responses
+
+
+class ItemOut(BaseModel):
+    id: int
+    name: str = Field(alias="title")
+    created_at: datetime.datetime
+    note: typing.Optional[str] = None
+
+
+ITEMS = [
+    ItemOut(id=i, title=f"item-{i}", created_at=datetime.datetime(2024, 1, 1))
+    for i in range(3)
+]
+
+
+@pytest.mark.asyncio
+async def test_default_response_class(app: FastAPI, client: AsyncClient):
+    @app.get("/test/raw")
+    async def raw():
+        return {"price": decimal.Decimal("1.5"), "item": ITEMS[0]}
+
+    response = await client.get("/test/raw")
+    assert response.json()["price"] == 1.5
+    assert response.json()["item"]["title"] == "item-0"
+
+    # FastAPI's own exceptions go through the orjson handlers too
+    response = await client.get("/test/missing")
+    assert response.status_code == 404
+    assert response.json() == {"detail": "Not Found"}
+
+
+@pytest.mark.asyncio
+async def test_validation_error(app: FastAPI, client: AsyncClient):
+    @app.get("/test/items/{item_id}")
+    async def get_item(item_id: int):
+        return {"id": item_id}
+
+    response = await client.get("/test/items/abc")
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"] == ["path", "item_id"]
+
+
+def test_orjson_response():
+    content = {"price": decimal.Decimal("0.10"), "tags": {"a"}, "item": ITEMS[0]}
+    body = orjson.loads(responses.ORJSONResponse(content).body)
+    assert body["price"] == "0.10"
+    assert body["tags"] == ["a"]
+    assert body["item"]["name"] == "item-0"
+
+
+def test_pydantic_response():
+    expected = [item.model_dump(mode="json", by_alias=True) for item in ITEMS]
+    assert orjson.loads(responses.PydanticResponse(ITEMS).body) == expected
+    assert orjson.loads(responses.PydanticResponse(ITEMS[0]).body) == expected[0]
+
+    # Any JSON value containing models, e.g. a keyset page
+    page = responses.PydanticResponse(
+        {"items": ITEMS, "next_cursor": None}, exclude_none=True, by_alias=False
+    )
+    body = orjson.loads(page.body)
+    assert body["items"][0] == {
+        "id": 0,
+        "name": "item-0",
+        "created_at": "2024-01-01T00:00:00",
+    }
+    assert body["next_cursor"] is None
@@ -1,8 +1,12 @@
+import time
+import asyncio
+import threading
+from unittest import mock
 import pytest
 from fastapi import FastAPI, HTTPException
 from fastapi.security import HTTPBasicCredentials, SecurityScopes
 
-from src.pkg import services, schema
+from src.pkg import metrics, services, schema, utils
 
 
 test_secruity_scopes = SecurityScopes()
@@ -61,3 +65,161 @@ def test_jwt_invalid_payload(app: FastAPI):
     token = jwt_handler.encode(payload)
     with pytest.raises(HTTPException):
         auth_service.authenticate_jwt(token, test_secruity_scopes)
+
+
+def test_authenticate_jwt_cache(app: FastAPI):
+    jwt_handler: services.JWTHandler = app.container.service.jwt_handler()
+    auth_service = services.AuthService(
+        jwt_handler=jwt_handler, admin_username="admin", admin_password="admin"
+    )
+    token = auth_service.create_jwt_token(user_id="123", scopes=["admin"])
+
+    user = auth_service.authenticate_jwt(token, test_secruity_scopes)
+    assert auth_service.token_cache.misses == 1
+    assert auth_service.token_cache.hits == 0
+
+    cached_user = auth_service.authenticate_jwt(token, SecurityScopes(["admin"]))
+    assert cached_user is user
+    assert auth_service.token_cache.hits == 1
+
+    # Scopes are still checked on cache hits
+    with pytest.raises(HTTPException) as exc_info:
+        auth_service.authenticate_jwt(token, SecurityScopes(["superuser"]))
+    assert exc_info.value.status_code == 403
+
+
+def test_authenticate_jwt_cache_capped_by_exp(app: FastAPI):
+    jwt_handler: services.JWTHandler = app.container.service.jwt_handler()
+    auth_service = services.AuthService(
+        jwt_handler=jwt_handler, admin_username="admin", admin_password="admin"
+    )
+    # Already expired tokens are rejected and never cached
+    payload = {"sub": "123", "scopes": [], "exp": 1}
+    token = jwt_handler.encode(payload)
+    with pytest.raises(HTTPException):
+        auth_service.authenticate_jwt(token, test_secruity_scopes)
+    assert len(auth_service.token_cache) == 0
+
+    # A token expiring before the configured TTL is cached until its exp only
+    token = jwt_handler.encode({"sub": "123", "scopes": [], "exp": time.time() + 5})
+    misses = auth_service.token_cache.misses
+    for _ in range(2):
+        auth_service.authenticate_jwt(token, test_secruity_scopes)
+    assert auth_service.token_cache.misses == misses + 1
+
+    # Past the exp, well within the 300s TTL, the token is verified again
+    later = time.monotonic() + 10
+    with mock.patch("src.pkg.utils.time.monotonic", return_value=later):
+        auth_service.authenticate_jwt(token, test_secruity_scopes)
+    assert auth_service.token_cache.misses == misses + 2
+
+
+def test_authenticate_jwt_cache_threads(app: FastAPI):
+    jwt_handler: services.JWTHandler = app.container.service.jwt_handler()
+    auth_service = services.AuthService(
+        jwt_handler=jwt_handler,
+        admin_username="admin",
+        admin_password="admin",
+        token_cache_size=4,
+    )
+    tokens = [
+        auth_service.create_jwt_token(user_id=str(i), scopes=[]) for i in range(16)
+    ]
+    errors = []
+
+    # Sync dependencies share the cache from the threadpool, with evictions
+    def authenticate():
+        try:
+            for _ in range(50):
+                for token in tokens:
+                    auth_service.authenticate_jwt(token, test_secruity_scopes)
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=authenticate) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    cache = auth_service.token_cache
+    assert len(cache) == 4
+    assert cache.hits + cache.misses == 8 * 50 * 16
+
+
+@pytest.mark.asyncio
+async def test_password_hash_async(app: FastAPI):
+    auth_service: services.AuthService = app.container.service.auth_service()
+    hashed_password = await auth_service.get_password_hash_async("password")
+    assert await auth_service.verify_password_async("password", hashed_password)
+    assert not await auth_service.verify_password_async("wrong", hashed_password)
+    assert auth_service.password_hasher.stats()["completed"] >= 3
+
+
+@pytest.mark.asyncio
+async def test_password_hasher_concurrency_cap():
+    hasher = services.PasswordHasher(max_concurrency=1)
+    release = threading.Event()
+
+    def blocking() -> str:
+        release.wait(timeout=5)
+        return "done"
+
+    first = asyncio.create_task(hasher.run(blocking))
+    second = asyncio.create_task(hasher.run(blocking))
+    while hasher.running == 0:
+        await asyncio.sleep(0.01)
+
+    assert hasher.stats()["running"] == 1
+    assert hasher.stats()["waiting"] == 1
+
+    release.set()
+    assert await asyncio.gather(first, second) == ["done", "done"]
+    assert hasher.stats() == {
+        "max_concurrency": 1,
+        "waiting": 0,
+        "running": 0,
+        "completed": 2,
+    }
+
+
+def test_lru_cache():
+    cache = utils.LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)  # Evicts "b", the least recently used key
+    assert "b" not in cache
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+    cache.set("d", 4, ttl=0)
+    assert cache.get("d") is None
+    assert cache.stats() == {
+        "size": 2,
+        "maxsize": 2,
+        "bytes": 0,
+        "hits": 3,
+        "misses": 1,
+    }
+
+
+@pytest.mark.asyncio
+async def test_authenticate_admin_hashed_password(app: FastAPI):
+    jwt_handler: services.JWTHandler = app.container.service.jwt_handler()
+    auth_service = services.AuthService(
+        jwt_handler=jwt_handler,
+        admin_username="admin",
+        admin_password=services.AuthService.get_password_hash("secret"),
+    )
+    completed = metrics.PASSWORD_HASH_COMPLETED.labels().value
+
+    credentials = HTTPBasicCredentials(username="admin", password="secret")
+    assert await auth_service.authenticate_admin_async(credentials)
+    credentials = HTTPBasicCredentials(username="admin", password="wrong")
+    assert not await auth_service.authenticate_admin_async(credentials)
+
+    assert metrics.PASSWORD_HASH_COMPLETED.labels().value == completed + 2
+    assert metrics.PASSWORD_HASH_RUNNING.labels().value == 0
+    assert metrics.PASSWORD_HASH_WAITING.labels().value == 0
@@ -0,0 +1,213 @@
+import json
+import time
+import asyncio
+import aioredis
+import pytest
+from unittest import mock
+
+from src.config import settings
+from src.pkg import codec, db, schema, services, utils
+
+
+def new_cache_service(**kwargs) -> services.CacheService:
+    client = db.CacheResource().init(settings.redis_dsn)
+    return services.CacheService(client, channel="test:cache:invalidate", **kwargs)
+
+
+def test_lru_cache_max_bytes():
+    cache = utils.LRUCache(maxsize=10, max_bytes=10)
+    cache.set("a", "a", size=4)
+    cache.set("b", "b", size=4)
+    cache.set("c", "c", size=4)  # Evicts "a" to stay under 10 bytes
+    assert "a" not in cache
+    assert cache.nbytes == 8
+
+    cache.set("b", "b", size=2)
+    assert cache.nbytes == 6
+    cache.set("big", "big", size=11)  # Larger than the whole cache
+    assert "big" not in cache
+    cache.delete("c")
+    assert cache.nbytes == 2
+
+
+@pytest.mark.asyncio
+async def test_cache_get_set_delete():
+    cache = new_cache_service()
+    await cache.delete("test:cache:key")
+    assert await cache.get("test:cache:key", "default") == "default"
+
+    await cache.set("test:cache:key", {"value": 1}, ttl=10)
+    raw = await cache.client.get("test:cache:key")
+    assert cache.codec.decode(raw) == {"value": 1}
+
+    # Reads are served locally until the key is invalidated
+    await cache.client.set("test:cache:key", cache.codec.encode({"value": 2}))
+    assert await cache.get("test:cache:key") == {"value": 1}
+    cache.invalidate_local(["test:cache:key"])
+    assert await cache.get("test:cache:key") == {"value": 2}
+    assert cache.local.stats()["hits"] == 1
+
+    assert await cache.delete("test:cache:key") == 1
+    assert await cache.get("test:cache:key") is None
+
+
+@pytest.mark.asyncio
+async def test_cache_invalidation_between_workers():
+    writer, reader = new_cache_service(), new_cache_service()
+    listener = services.CacheInvalidationListener()
+    task = await listener.init(reader)
+    try:
+        # Wait for the subscription, which also flushes the local cache
+        for _ in range(100):
+            if reader._generation:
+                break
+            await asyncio.sleep(0.01)
+
+        await writer.set("test:cache:shared", 1)
+        await asyncio.sleep(0.05)
+        assert await reader.get("test:cache:shared") == 1
+        assert "test:cache:shared" in reader.local
+
+        await writer.set("test:cache:shared", 2)
+        for _ in range(100):
+            if "test:cache:shared" not in reader.local:
+                break
+            await asyncio.sleep(0.01)
+        assert await reader.get("test:cache:shared") == 2
+
+        # A worker ignores its own messages
+        writer.handle_invalidation(
+            json.dumps({"node": writer.node_id, "keys": ["test:cache:shared"]})
+        )
+        assert "test:cache:shared" in writer.local
+    finally:
+        await listener.shutdown(task)
+        await writer.delete("test:cache:shared")
+
+
+@pytest.mark.asyncio
+async def test_get_or_compute_single_flight():
+    caches = [new_cache_service(), new_cache_service()]
+    await caches[0].delete("test:cache:computed")
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return {"value": calls}
+
+    # Concurrent misses in one worker and across workers
+    results = await asyncio.gather(
+        *(
+            cache.get_or_compute(
+                "test:cache:computed", compute, ttl=10, poll_interval=0.01
+            )
+            for cache in caches
+            for _ in range(5)
+        )
+    )
+    assert calls == 1
+    assert results == [{"value": 1}] * 10
+    assert not await caches[0].client.exists("lock:test:cache:computed")
+
+    await caches[0].delete("test:cache:computed")
+
+
+@pytest.mark.asyncio
+async def test_get_or_compute_lock_winner_rereads():
+    caches = [new_cache_service(), new_cache_service()]
+    await caches[0].delete("test:cache:raced")
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        return {"value": calls}
+
+    await caches[1].get_or_compute("test:cache:raced", compute, ttl=10)
+    # The first worker missed just before the second one stored the value and
+    # released the lock, it takes the lock but does not recompute
+    with mock.patch.object(caches[0], "get", mock.AsyncMock(return_value=None)):
+        value = await caches[0].get_or_compute("test:cache:raced", compute, ttl=10)
+    assert (value, calls) == ({"value": 1}, 1)
+    assert not await caches[0].client.exists("lock:test:cache:raced")
+
+    await caches[0].delete("test:cache:raced")
+
+
+def test_get_or_compute_early_refresh():
+    envelope = {"value": 1, "delta": 100.0, "expiry": time.time() + 10}
+    with mock.patch("src.pkg.services.random.random", return_value=0.5):
+        # Slow to compute and close to expiry
+        assert services.CacheService._should_refresh(envelope, beta=1.0)
+        assert not services.CacheService._should_refresh(envelope, beta=0.0)
+        envelope["delta"] = 0.01
+        assert not services.CacheService._should_refresh(envelope, beta=1.0)
+
+
+@pytest.mark.asyncio
+async def test_cache_mget_mset_pipelined():
+    cache = new_cache_service()
+    keys = [f"test:cache:many:{i}" for i in range(5)]
+    await cache.delete(*keys)
+
+    batches = cache.batcher.batches
+    await cache.mset({key: i for i, key in enumerate(keys[:3])}, ttl=10)
+    # Three SETs and the invalidation message go out in one pipeline
+    assert cache.batcher.batches == batches + 1
+
+    cache.invalidate_local()
+    batches = cache.batcher.batches
+    values = await asyncio.gather(*(cache.get(key) for key in keys))
+    assert values == [0, 1, 2, None, None]
+    assert cache.batcher.batches == batches + 1
+
+    assert await cache.mget(keys) == {keys[0]: 0, keys[1]: 1, keys[2]: 2}
+    assert await cache.delete(*keys) == 3
+
+
+@pytest.mark.asyncio
+async def test_redis_batcher_errors():
+    batcher = new_cache_service().batcher
+    await batcher.execute("SET", "test:cache:batcher", "text")
+    ok, error = await asyncio.gather(
+        batcher.execute("GET", "test:cache:batcher"),
+        batcher.execute("INCR", "test:cache:batcher"),
+        return_exceptions=True,
+    )
+    # A failing command does not fail the rest of the batch
+    assert ok == b"text"
+    assert isinstance(error, aioredis.ResponseError)
+    assert await batcher.execute("DEL", "test:cache:batcher") == 1
+
+
+@pytest.mark.asyncio
+async def test_redis_batcher_close():
+    batcher = new_cache_service().batcher
+    future = batcher.execute("SET", "test:cache:batcher", "1")
+    # Queued commands are sent and the pipeline tasks kept until done
+    await batcher.close()
+    assert future.done()
+    assert not batcher._tasks
+    assert await batcher.execute("DEL", "test:cache:batcher") == 1
+
+
+@pytest.mark.parametrize("serializer", list(schema.CacheSerializer))
+@pytest.mark.parametrize("compression", list(schema.CacheCompression))
+def test_cache_codec(serializer, compression):
+    cache_codec = codec.CacheCodec(serializer, compression, compress_threshold=64)
+    small = {"id": 1, "name": "small"}
+    large = {"rows": [{"id": i, "name": "row"} for i in range(100)]}
+
+    assert cache_codec.decode(cache_codec.encode(small)) == small
+    encoded = cache_codec.encode(large)
+    assert cache_codec.decode(encoded) == large
+    if compression != schema.CacheCompression.none:
+        assert len(encoded) < len(codec.CacheCodec(serializer).encode(large))
+
+    # Values written with other compression settings stay readable
+    other = codec.CacheCodec(serializer, schema.CacheCompression.zlib, 0)
+    assert cache_codec.decode(other.encode(large)) == large
+    with pytest.raises(ValueError):
+        cache_codec.decode(b"\xff{}")
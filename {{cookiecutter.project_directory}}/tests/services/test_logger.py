@@ -0,0 +1,65 @@
+import sys
+import json
+import pytest
+from datetime import time as datetime_time
+from loguru import logger
+
+from src.pkg import services
+
+
+@pytest.fixture()
+def logger_init():
+    resource = services.LoggerInit()
+    yield resource
+    resource.shutdown()
+    logger.add(sys.stderr)
+
+
+def test_logger_json_enqueue_sampling(logger_init, tmp_path, capsys):
+    logger_init.init(
+        app_name="test",
+        log_path=str(tmp_path),
+        show_log_level="DEBUG",
+        write_log_level="INFO",
+        enqueue=True,
+        json_format=True,
+        sampling={"DEBUG": 0.0},
+    )
+    logger.bind(request_id="r1").info("hello {}", "world")
+    logger.debug("dropped by sampling")
+    try:
+        1 / 0
+    except ZeroDivisionError:
+        logger.exception("failed")
+    # Waits for the background thread
+    logger_init.shutdown()
+
+    lines = (tmp_path / "test.log").read_text().splitlines()
+    first, second = [json.loads(line) for line in lines]
+    assert first["message"] == "hello world"
+    assert first["level"] == "INFO"
+    assert first["extra"] == {"request_id": "r1"}
+    assert first["function"] == "test_logger_json_enqueue_sampling"
+    assert "ZeroDivisionError" in second["exception"]
+
+    stdout = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [record["message"] for record in stdout] == [
+        f"Save log to {tmp_path / 'test.log'}",
+        "hello world",
+        "failed",
+    ]
+
+
+def test_daily_file_rotation(tmp_path):
+    log_file = services._DailyFile(tmp_path / "app.log", datetime_time(12))
+    log_file.write("first\n")
+    # Past the rotation time
+    log_file._rotate_at = 0
+    log_file.write("second\n")
+    log_file.close()
+
+    rotated = [path for path in tmp_path.iterdir() if path.name != "app.log"]
+    assert len(rotated) == 1
+    assert rotated[0].name.startswith("app.")
+    assert rotated[0].read_text() == "first\n"
+    assert (tmp_path / "app.log").read_text() == "second\n"
@@ -0,0 +1,47 @@
+import time
+import asyncio
+import pytest
+from loguru import logger
+
+from src.pkg import metrics, services
+
+
+def block_the_loop():
+    time.sleep(0.3)
+
+
+@pytest.mark.asyncio
+async def test_loop_monitor():
+    messages = []
+    handler_id = logger.add(messages.append, level="WARNING", format="{message}")
+    blocked = metrics.EVENT_LOOP_BLOCKED.labels().value
+    lag = metrics.EVENT_LOOP_LAG.labels()
+    observed, total = sum(lag.counts), lag.sum
+
+    resource = services.LoopMonitor()
+    task = await resource.init(interval_ms=20, threshold_ms=100)
+    try:
+        await asyncio.sleep(0.1)
+        block_the_loop()
+        await asyncio.sleep(0.1)
+    finally:
+        await resource.shutdown(task)
+        logger.remove(handler_id)
+
+    assert metrics.EVENT_LOOP_BLOCKED.labels().value == blocked + 1
+    assert sum(lag.counts) > observed
+    # The late wake-up is in the histogram
+    assert lag.sum - total >= 0.2
+
+    (message,) = messages
+    assert message.startswith("[LoopMonitor]::Event loop blocked for")
+    assert "in block_the_loop" in message
+    assert "time.sleep(0.3)" in message
+
+
+@pytest.mark.asyncio
+async def test_loop_monitor_disabled():
+    resource = services.LoopMonitor()
+    task = await resource.init(enabled=False)
+    assert task is None
+    await resource.shutdown(task)
@@ -0,0 +1,70 @@
+import asyncio
+import pytest
+
+from src.pkg import services
+
+
+@pytest.mark.asyncio
+async def test_readiness_concurrent_checks_and_timeout():
+    calls = []
+
+    async def database():
+        calls.append("database")
+        return True
+
+    async def hung():
+        calls.append("hung")
+        await asyncio.sleep(10)
+
+    async def broken():
+        raise ConnectionRefusedError()
+
+    readiness = services.ReadinessService(
+        {"database": database, "cache": hung, "broker": broken},
+        timeout_ms=50,
+        ttl_ms=10000,
+    )
+    # Concurrent probes share one run, bounded by the timeout
+    results = await asyncio.wait_for(
+        asyncio.gather(*(readiness.check() for _ in range(10))), 1
+    )
+    assert calls == ["database", "hung"]
+    result = results[0]
+    assert all(other is result for other in results)
+    assert result["ready"] is False
+    assert result["checks"]["database"]["ok"] is True
+    assert result["checks"]["cache"]["error"] == "timeout"
+    assert result["checks"]["broker"]["error"] == "ConnectionRefusedError()"
+
+    # Cached within the ttl
+    assert await readiness.check() is result
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_readiness_background_refresh():
+    state = {"ok": True, "calls": 0}
+
+    async def database():
+        state["calls"] += 1
+        await asyncio.sleep(0.02)
+        return state["ok"]
+
+    readiness = services.ReadinessService(
+        {"database": database}, timeout_ms=1000, ttl_ms=20
+    )
+    assert (await readiness.check())["ready"] is True
+
+    await asyncio.sleep(0.03)
+    state["ok"] = False
+    # Stale result served right away while one refresh runs
+    assert (await readiness.check())["ready"] is True
+    assert (await readiness.check())["ready"] is True
+    await asyncio.sleep(0.05)
+    assert (await readiness.check())["ready"] is False
+    assert state["calls"] == 2
+
+    # Too old to be served, the probe waits for the refresh
+    await asyncio.sleep(1.1)
+    state["ok"] = True
+    assert (await readiness.check())["ready"] is True
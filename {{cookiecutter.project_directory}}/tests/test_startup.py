@@ -0,0 +1,61 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]  # app folder
+
+
+def imported_modules(code: str) -> set:
+    # A fresh interpreter, the test session has imported everything already
+    env = {**os.environ, "PYTHONPATH": str(ROOT)}
+    env.pop("SENTRY_DSN", None)
+    result = subprocess.run(
+        [sys.executable, "-c", f"{code}\nimport sys\nprint(*sys.modules)"],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return set(result.stdout.split())
+
+
+def test_app_is_built_lazily():
+    modules = imported_modules("import src.main\nassert 'app' not in vars(src.main)")
+    assert "celery" not in modules
+    assert "sentry_sdk" not in modules
+
+    modules = imported_modules("import src.main\nsrc.main.app")
+    assert "celery" in modules
+    assert "sentry_sdk" not in modules
+
+
+def test_worker_entry_does_not_build_the_app():
+    modules = imported_modules("import src.worker.app")
+    assert "src.worker.tasks" in modules
+    assert "src.main" not in modules
+    assert "fastapi" not in modules
+    assert "sentry_sdk" not in modules
+
+
+def test_celery_alias():
+    from src.main import celery
+    from src.worker.app import celery as worker_celery
+
+    assert celery is worker_celery
+
+
+def test_worker_does_not_start_server_tasks():
+    from dependency_injector import providers
+    from src.pkg import containers, services
+
+    # The worker initialises the service resources on a short-lived loop
+    resources = {
+        resource.provides
+        for resource in containers.Application().service.traverse(
+            types=[providers.Resource]
+        )
+    }
+    assert services.LoopMonitor not in resources
+    assert services.CacheInvalidationListener not in resources